@@ -0,0 +1,57 @@
+# aggregates.py
+from sqlalchemy import func, literal_column, String
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from models import db, BillRecord, BillUsage
+
+
+class period_key(FunctionElement):
+    """Text period of a date column, e.g. '2025-03', compiled to the database's own date formatting."""
+    type = String()
+    inherit_cache = True
+    strftime_format = '%Y-%m'
+    to_char_format = 'YYYY-MM'
+
+
+class year_period_key(period_key):
+    inherit_cache = True
+    strftime_format = '%Y'
+    to_char_format = 'YYYY'
+
+
+# The format is inlined rather than bound, so the SELECT and GROUP BY render the same expression
+@compiles(period_key)
+def compile_period_key(element, compiler, **kw):
+    return compiler.process(func.strftime(literal_column(f"'{element.strftime_format}'"), *element.clauses), **kw)
+
+
+@compiles(period_key, 'postgresql')
+def compile_period_key_postgresql(element, compiler, **kw):
+    return compiler.process(func.to_char(*element.clauses, literal_column(f"'{element.to_char_format}'")), **kw)
+
+
+def month_key(column=BillRecord.bill_date):
+    return period_key(column)
+
+
+def year_key(column=BillRecord.bill_date):
+    return year_period_key(column)
+
+
+def emission_totals_by_user():
+    """Return (user_id, total_emission_kgco2e, bill_count) tuples for every company with bills."""
+    return db.session.query(BillRecord.user_id,
+                            func.coalesce(func.sum(BillRecord.total_emission_kgco2e), 0.0),
+                            func.count(BillRecord.id)) \
+        .group_by(BillRecord.user_id).all()
+
+
+def source_totals():
+    """Return (source, bill_count, kgco2e, co2_tonnes) tuples across all companies.
+
+    One query; the (source, bill_id) index lets the database group without a sort.
+    """
+    return db.session.query(BillUsage.source, func.count(BillUsage.bill_id),
+                            func.coalesce(func.sum(BillUsage.kgco2e), 0.0),
+                            func.coalesce(func.sum(BillUsage.co2_tonnes), 0.0)) \
+        .group_by(BillUsage.source).order_by(BillUsage.source).all()
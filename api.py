@@ -0,0 +1,146 @@
+# api.py
+import json
+import gzip
+import base64
+import hashlib
+from datetime import datetime
+from flask import Blueprint, request, make_response, abort
+from flask_login import login_required, current_user
+from sqlalchemy import or_, and_
+from models import db, User, BillRecord, BillUsage
+from scoring import leaderboard_entries
+from charts import dashboard_data
+from aggregates import source_totals
+from rollups import year_over_year, sector_monthly_averages
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+GZIP_MIN_BYTES = 512
+MAX_PER_PAGE = 100
+
+
+def json_response(payload):
+    """JSON response with a weak ETag, 304 on a matching If-None-Match, and gzip when accepted."""
+    body = json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+    etag = hashlib.sha1(body).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(body)
+        response.mimetype = 'application/json'
+        if len(body) >= GZIP_MIN_BYTES and 'gzip' in request.accept_encodings:
+            response.set_data(gzip.compress(body, compresslevel=6))
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def int_arg(name, default, minimum=1, maximum=None):
+    value = request.args.get(name, default, type=int)
+    if value is None or value < minimum:
+        abort(400, f'{name} must be an integer >= {minimum}')
+    return min(value, maximum) if maximum else value
+
+
+def encode_cursor(bill):
+    raw = f'{bill.uploaded_at.isoformat()}|{bill.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        uploaded_at, bill_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(uploaded_at), int(bill_id)
+    except (ValueError, UnicodeDecodeError):
+        abort(400, 'invalid cursor')
+
+
+def serialize_bill(bill, usages):
+    data = {
+        'id': bill.id,
+        'bill_number': bill.bill_number,
+        'bill_date': bill.bill_date.isoformat() if bill.bill_date else None,
+        'billing_period_start': bill.billing_period_start.isoformat() if bill.billing_period_start else None,
+        'billing_period_end': bill.billing_period_end.isoformat() if bill.billing_period_end else None,
+        'uploaded_at': bill.uploaded_at.isoformat() if bill.uploaded_at else None,
+        'total_co2_tonnes': bill.total_co2_tonnes,
+        'total_emission_kgco2e': bill.total_emission_kgco2e,
+        'usage': {},
+        'emissions': {},
+    }
+    for source, unit, value, co2, kgco2e in usages.get(bill.id, []):
+        data['usage'][source] = {'value': value, 'unit': unit}
+        if kgco2e is not None:
+            data['emissions'][source] = {'co2_tonnes': co2, 'emission_kgco2e': kgco2e}
+    return data
+
+
+@api.route('/dashboard')
+@login_required
+def dashboard():
+    return json_response(dashboard_data(current_user.id))
+
+
+@api.route('/leaderboard')
+@login_required
+def leaderboard():
+    page = int_arg('page', 1)
+    per_page = int_arg('per_page', 25, maximum=MAX_PER_PAGE)
+    total = User.query.count()
+    entries = leaderboard_entries(offset=(page - 1) * per_page, limit=per_page)
+    return json_response({
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': (total + per_page - 1) // per_page,
+        'entries': entries,
+    })
+
+
+@api.route('/bills')
+@login_required
+def bills():
+    limit = int_arg('limit', 50, maximum=MAX_PER_PAGE)
+    # Keyset pagination over the (user_id, uploaded_at) index, newest first
+    query = BillRecord.query.filter(BillRecord.user_id == current_user.id)
+    cursor = request.args.get('cursor')
+    if cursor:
+        uploaded_at, bill_id = decode_cursor(cursor)
+        query = query.filter(or_(BillRecord.uploaded_at < uploaded_at,
+                                 and_(BillRecord.uploaded_at == uploaded_at, BillRecord.id < bill_id)))
+    page = query.order_by(BillRecord.uploaded_at.desc(), BillRecord.id.desc()).limit(limit + 1).all()
+    has_more = len(page) > limit
+    page = page[:limit]
+    usages = {}
+    if page:
+        rows = db.session.query(BillUsage.bill_id, BillUsage.source, BillUsage.unit, BillUsage.value,
+                                BillUsage.co2_tonnes, BillUsage.kgco2e) \
+            .filter(BillUsage.bill_id.in_([bill.id for bill in page])).order_by(BillUsage.id)
+        for bill_id, *usage in rows:
+            usages.setdefault(bill_id, []).append(usage)
+    return json_response({
+        'bills': [serialize_bill(bill, usages) for bill in page],
+        'next_cursor': encode_cursor(page[-1]) if has_more else None,
+    })
+
+
+@api.route('/sources')
+@login_required
+def sources():
+    return json_response({'sources': [
+        {'source': source, 'bill_count': count, 'emission_kgco2e': kgco2e, 'co2_tonnes': co2}
+        for source, count, kgco2e, co2 in source_totals()]})
+
+
+@api.route('/trends/year-over-year')
+@login_required
+def trends_year_over_year():
+    return json_response({'years': year_over_year(current_user.id)})
+
+
+@api.route('/trends/sector')
+@login_required
+def trends_sector():
+    return json_response({'months': sector_monthly_averages(current_user.id)})
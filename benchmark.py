@@ -0,0 +1,197 @@
+# benchmark.py
+"""Benchmark the request hot paths against a seeded SQLite database.
+
+    python benchmark.py --sizes 100,1000,10000,100000 --output bench.json
+
+Each size seeds a fresh database with that many bills spread over --bills-per-user companies,
+stubs OCR/Gemini with local callables and reports latency percentiles (ms) and peak Python
+memory (KiB) per target as JSON, so runs can be compared over time.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from datetime import date, datetime, timedelta
+from functools import partial
+
+TARGETS = ['dashboard', 'dashboard_cold', 'leaderboard', 'previous_bills', 'calculate_emissions', 'compute_score']
+SAMPLE_BILL = {
+    'electricity_usage_value': 1250.0, 'electricity_usage_unit': 'kWh',
+    'water_usage_value': 12.0, 'water_usage_unit': 'm3',
+    'diesel_usage_value': 45.0, 'diesel_usage_unit': 'liters',
+    'coal_usage_value': 2.0, 'coal_usage_unit': 'tons',
+    'trade_co2_value': 1.5,
+}
+PASSWORD = 'benchmark'
+
+
+def stub_ocr(file_path, timeout=None):
+    return {'text': 'Electricity consumption 1250 kWh', 'error': ''}
+
+
+def stub_extractor(raw_text, timeout=None):
+    return {'bill_date': '2025-01-01', 'bill_number': 'BENCH', 'electricity_usage_value': 1250.0,
+            'electricity_usage_unit': 'kWh'}
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+    return {'p50': pct(50), 'p90': pct(90), 'p99': pct(99), 'mean': sum(ordered) / len(ordered),
+            'max': ordered[-1], 'samples': len(ordered)}
+
+
+def seed(db, n_bills, bills_per_user, rng):
+    from werkzeug.security import generate_password_hash
+    from models import User, BillRecord, BillUsage
+    from factors import SOURCE_FIELDS, DEFAULT_UNITS
+    from forms import unit_choices
+    from recalc import recalculate_emissions
+    from scoring import rebuild_summaries
+    from rollups import rebuild_rollups
+
+    n_users = max(1, n_bills // bills_per_user)
+    password_hash = generate_password_hash(PASSWORD)
+    db.session.execute(User.__table__.insert(), [
+        {'company_name': f'Company {i}', 'email': f'bench{i}@example.com', 'password_hash': password_hash,
+         'logo_path': 'defaultlogo.png'} for i in range(n_users)])
+    user_ids = [uid for (uid,) in db.session.query(User.id)]
+    units = {source: unit_choices(unit_key) if unit_key else [DEFAULT_UNITS[source]]
+             for source, (_, unit_key) in SOURCE_FIELDS.items()}
+    start = date(2020, 1, 1)
+    bills, usages = [], []
+    for i in range(n_bills):
+        bills.append({'id': i + 1, 'user_id': user_ids[i % n_users], 'bill_number': f'B{i}',
+                      'bill_date': start + timedelta(days=rng.randrange(5 * 365)),
+                      'uploaded_at': datetime(2025, 1, 1) + timedelta(seconds=i)})
+        for source in rng.sample(list(SOURCE_FIELDS), 4):
+            usages.append({'bill_id': i + 1, 'source': source, 'unit': rng.choice(units[source]),
+                           'value': round(rng.uniform(1, 10000), 2)})
+        if len(bills) == 5000 or i == n_bills - 1:
+            db.session.execute(BillRecord.__table__.insert(), bills)
+            db.session.execute(BillUsage.__table__.insert(), usages)
+            bills, usages = [], []
+    db.session.commit()
+    recalculate_emissions(log=lambda message: None)
+    rebuild_summaries()
+    rebuild_rollups()
+    return n_users
+
+
+def measure(fn, repeat):
+    fn()  # warm up
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'latency_ms': percentiles(timings), 'peak_memory_kib': peak / 1024}
+
+
+def run_size(n_bills, args):
+    workdir = tempfile.mkdtemp(prefix='carbonranker-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    for name in [m for m in sys.modules if m in ('app', 'config', 'api', 'charts', 'views')]:
+        del sys.modules[name]
+    import app as app_module
+    from models import db, User, CompanyEmissionSummary
+    from emissions import calculate_emissions
+    from scoring import compute_score
+    from pipeline import BillPipeline
+
+    app = app_module.create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    app_module.job_queue.pipeline = BillPipeline(app, stub_ocr, stub_extractor)
+    rng = random.Random(args.seed)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        n_users = seed(db, n_bills, args.bills_per_user, rng)
+        seed_seconds = time.perf_counter() - started
+        user = User.query.order_by(User.id).first()
+        summary = db.session.get(CompanyEmissionSummary, user.id)
+
+    client = app.test_client()
+    client.post('/login', data={'email': user.email, 'password': PASSWORD})
+
+    def get(path):
+        response = client.get(path)
+        assert response.status_code == 200, (path, response.status_code)
+
+    def dashboard_cold():
+        app_module.chart_cache.clear()
+        get('/dashboard')
+
+    def in_context(fn):
+        def call():
+            with app.app_context():
+                fn()
+        return call
+
+    targets = {
+        'dashboard': partial(get, '/dashboard'),
+        'dashboard_cold': dashboard_cold,
+        'leaderboard': partial(get, '/leaderboard'),
+        'previous_bills': partial(get, '/previous_bills'),
+        'calculate_emissions': partial(calculate_emissions, SAMPLE_BILL),
+        'compute_score': in_context(partial(compute_score, summary.total_emission, summary.bill_count)),
+    }
+    results = []
+    for name in args.targets:
+        result = measure(targets[name], args.repeat)
+        results.append({'bills': n_bills, 'users': n_users, 'target': name, **result})
+        print(f"{n_bills:>8} bills  {name:<20} p50 {result['latency_ms']['p50']:9.2f} ms  "
+              f"p99 {result['latency_ms']['p99']:9.2f} ms  peak {result['peak_memory_kib']:10.1f} KiB",
+              file=sys.stderr)
+    with app.app_context():
+        db.engine.dispose()
+    shutil.rmtree(workdir, ignore_errors=True)
+    return {'bills': n_bills, 'users': n_users, 'seed_seconds': seed_seconds, 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='100,1000,10000,100000', help='Comma-separated bill counts.')
+    parser.add_argument('--bills-per-user', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20, help='Timed calls per target.')
+    parser.add_argument('--targets', default=','.join(TARGETS), help='Comma-separated subset of ' + ', '.join(TARGETS))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write JSON results here instead of stdout.')
+    args = parser.parse_args()
+    args.targets = [t for t in args.targets.split(',') if t]
+    unknown = set(args.targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+
+    # Run from the repository so emission_factors.csv and templates resolve
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+    report = {
+        'meta': {'timestamp': datetime.utcnow().isoformat() + 'Z', 'python': platform.python_version(),
+                 'platform': platform.platform(), 'repeat': args.repeat, 'seed': args.seed,
+                 'bills_per_user': args.bills_per_user},
+        'runs': [run_size(int(size), args) for size in args.sizes.split(',') if size],
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
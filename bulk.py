@@ -0,0 +1,116 @@
+# bulk.py
+import os
+import re
+import zipfile
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from werkzeug.utils import secure_filename
+from models import BillRecord
+from forms import unit_choices
+from factors import SOURCE_FIELDS
+from emissions import apply_usage
+from storage import save_content_addressed, FileTooLarge
+from extractors import UNIT_ALIASES
+
+BILL_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tif', '.tiff', '.webp', '.pdf'}
+DATE_FIELDS = ('bill_date', 'billing_period_start', 'billing_period_end')
+
+
+def save_bulk_files(files, bills_dir, max_bytes=None):
+    """Save uploaded files to bills_dir, expanding zip archives.
+
+    Returns (saved, rejected): (filename, path) pairs and (filename, error) pairs for files over max_bytes
+    and archives that cannot be read.
+    """
+    saved = []
+    rejected = []
+    for storage in files:
+        filename = secure_filename(storage.filename or '')
+        if not filename:
+            continue
+        if filename.lower().endswith('.zip'):
+            try:
+                with zipfile.ZipFile(storage.stream) as archive:
+                    for member in archive.infolist():
+                        name = secure_filename(os.path.basename(member.filename))
+                        if member.is_dir() or os.path.splitext(name)[1].lower() not in BILL_EXTENSIONS:
+                            continue
+                        try:
+                            with archive.open(member) as src:
+                                path, _ = save_content_addressed(src, bills_dir, name, max_bytes=max_bytes)
+                        except FileTooLarge as e:
+                            rejected.append((name, str(e)))
+                        else:
+                            saved.append((name, path))
+            except zipfile.BadZipFile:
+                rejected.append((filename, 'Not a valid zip archive'))
+        else:
+            try:
+                path, _ = save_content_addressed(storage.stream, bills_dir, filename, max_bytes=max_bytes)
+            except FileTooLarge as e:
+                rejected.append((filename, str(e)))
+            else:
+                saved.append((filename, path))
+    return saved, rejected
+
+
+def match_unit(unit, choices):
+    """The choice unit names, by exact name or any spelling extraction recognises (litres, L, m³)."""
+    exact = next((c for c in choices if c.lower() == unit.lower()), None)
+    if exact is not None or not unit:
+        return exact
+    return next((c for c in choices if c in UNIT_ALIASES and re.fullmatch(UNIT_ALIASES[c], unit, re.IGNORECASE)),
+                None)
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def bill_data(extracted):
+    """Turn an extraction result into BillEditForm-shaped data; raises ValueError on unknown units."""
+    data = {'bill_number': extracted.get('bill_number') or ''}
+    for key in DATE_FIELDS:
+        data[key] = parse_date(extracted.get(key))
+    for source, (value_key, unit_key) in SOURCE_FIELDS.items():
+        value = extracted.get(value_key)
+        data[value_key] = float(value) if value is not None else None
+        if unit_key:
+            unit = (extracted.get(unit_key) or '').strip()
+            choices = unit_choices(unit_key)
+            match = match_unit(unit, choices)
+            if data[value_key] is not None and match is None:
+                raise ValueError(f"Unrecognised unit '{unit}' for {source}")
+            data[unit_key] = match
+    return data
+
+
+def build_bill(user_id, data, file_path):
+    bill = BillRecord(user_id=user_id, bill_file_path=file_path,
+                      bill_number=data['bill_number'], **{key: data[key] for key in DATE_FIELDS})
+    return apply_usage(bill, data)
+
+
+def extract_all(paths, pipeline, max_workers=4, timeout=120):
+    """Run pipeline once per distinct path on a bounded pool; returns a result for every path, in input order.
+
+    Uploads with the same content are stored at the same path, so copies share one OCR/LLM run.
+    """
+    results = {}
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bulk-extract')
+    try:
+        futures = {path: pool.submit(pipeline, path) for path in dict.fromkeys(paths)}
+        for path, future in futures.items():
+            try:
+                results[path] = future.result(timeout=timeout)
+            except FutureTimeout:
+                results[path] = {'error': f'Extraction timed out after {timeout}s'}
+            except Exception as e:
+                results[path] = {'error': f"Extraction failed: {str(e)}"}
+    finally:
+        # Do not block the request on calls that already timed out
+        pool.shutdown(wait=False, cancel_futures=True)
+    return [results[path] for path in paths]
@@ -0,0 +1,115 @@
+# chart_cache.py
+import json
+import time
+import threading
+from collections import OrderedDict
+from metrics import register_gauge
+
+
+class MemoryBackend:
+    """In-process LRU cache whose entries expire after ttl seconds."""
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisBackend:
+    """Redis (or any Redis-protocol server) backend; values are stored as JSON with a TTL."""
+
+    def __init__(self, url='redis://localhost:6379/0', ttl=300, prefix='carbonranker:charts:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + str(key))
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value):
+        self.client.set(self.prefix + str(key), json.dumps(value), ex=self.ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + str(key))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+class ChartCache:
+    """Per-user cache of computed dashboard chart data with hit/miss counters.
+
+    Entries are keyed by the user and a version of their data, so a save or rebuild seen by any worker
+    makes older entries unreachable instead of relying on each process clearing its own copy.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryBackend()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        if app.config.get('CHART_CACHE_BACKEND', 'memory') == 'redis':
+            self.backend = RedisBackend(app.config['CHART_CACHE_REDIS_URL'], app.config['CHART_CACHE_TTL'])
+        else:
+            self.backend = MemoryBackend(app.config['CHART_CACHE_MAX_ENTRIES'], app.config['CHART_CACHE_TTL'])
+        app.extensions['chart_cache'] = self
+
+    def get_or_compute(self, user_id, version, compute):
+        key = f'{user_id}:{version}'
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if value is None:
+            value = compute()
+            self.backend.set(key, value)
+        return value
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return {'backend': type(self.backend).__name__, 'hits': self.hits, 'misses': self.misses}
+
+
+chart_cache = ChartCache()
+register_gauge('carbonranker_chart_cache_hits_total', 'Dashboard chart cache hits.',
+               lambda: chart_cache.hits, 'counter')
+register_gauge('carbonranker_chart_cache_misses_total', 'Dashboard chart cache misses.',
+               lambda: chart_cache.misses, 'counter')
@@ -0,0 +1,59 @@
+# charts.py
+from collections import defaultdict
+from models import db, CompanyEmissionSummary
+from factors import SOURCES_LIST
+from rollups import series, source_series
+from chart_cache import chart_cache
+from scoring import company_score
+from metrics import timed
+
+
+@timed('build_chart_data')
+def build_chart_data(user_id):
+    # Read from the emission rollups, so the cost depends on the months covered, not the bill count
+    # Line chart: emissions over time (monthly total)
+    monthly_emissions = dict(series(user_id, 'month'))
+    line_labels = list(monthly_emissions.keys())
+    line_data = list(monthly_emissions.values())
+
+    # Bar chart: breakdown per month per source; Pie chart: total contribution per source
+    monthly_sources = defaultdict(dict)
+    for month_key, source, kgco2e in source_series(user_id, 'month'):
+        monthly_sources[month_key][source] = kgco2e
+    total_sources = {source: kgco2e for _, source, kgco2e in source_series(user_id, 'all')}
+    sources_list = SOURCES_LIST
+    bar_labels = sorted(monthly_sources.keys())
+    bar_datasets = []
+    for source in sources_list:
+        data = [monthly_sources[m].get(source, 0) for m in bar_labels]
+        bar_datasets.append({'label': source, 'data': data})
+    pie_labels = [source for source in sources_list if source in total_sources]
+    pie_data = [total_sources[source] for source in pie_labels]
+
+    # Trend % change
+    if len(line_labels) >= 2:
+        last = monthly_emissions[line_labels[-1]]
+        prev = monthly_emissions[line_labels[-2]]
+        trend_pct = ((last - prev) / prev * 100) if prev != 0 else 0
+    else:
+        trend_pct = 0
+
+    return {
+        'line': {'labels': line_labels, 'data': line_data},
+        'bar': {'labels': bar_labels, 'datasets': bar_datasets},
+        'pie': {'labels': pie_labels, 'data': pie_data},
+        'trend_pct': round(trend_pct, 2)
+    }
+
+
+def chart_version(user_id):
+    """Changes whenever the user's rollups do: record_bill and rebuild_rollups both touch the summary row."""
+    summary = db.session.get(CompanyEmissionSummary, user_id)
+    return f'{summary.bill_count}:{summary.updated_at}' if summary else 'empty'
+
+
+def dashboard_data(user_id):
+    # Charts only change when this user's bills do; the score moves with everyone's bills
+    chart_data = dict(chart_cache.get_or_compute(user_id, chart_version(user_id), lambda: build_chart_data(user_id)))
+    chart_data['score'] = company_score(user_id)
+    return chart_data
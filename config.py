@@ -1,10 +1,55 @@
 # config.py
 import os
+from database import engine_options
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key'
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///carbonranker.db'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///carbonranker.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Pool size/overflow/recycle/pre-ping come from DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE, ...
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    DB_BUSY_TIMEOUT = float(os.environ.get('DB_BUSY_TIMEOUT', 30))  # seconds a SQLite writer waits for the lock
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    AUTO_MIGRATE = os.environ.get('AUTO_MIGRATE', '0') == '1'  # apply pending migrations at startup
     UPLOAD_FOLDER = 'uploads'
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 64 * 1024 * 1024))  # whole request, incl. bulk zips
+    UPLOAD_MAX_FILE_BYTES = int(os.environ.get('UPLOAD_MAX_FILE_BYTES', 20 * 1024 * 1024))  # each stored file
+    UPLOAD_CACHE_MAX_AGE = int(os.environ.get('UPLOAD_CACHE_MAX_AGE', 3600))  # files not named by content hash
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', '0') == '1'  # let the front-end server send uploads
+    THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', 2))
     OCR_SPACE_API_KEY = os.environ.get('OCR_SPACE_API_KEY')  # Set your OCR Space API key here
-    GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')  # Set
\ No newline at end of file
+    GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')  # Set
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+    JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS', 600))  # unfinished jobs idle this long are retried or failed
+    BULK_UPLOAD_WORKERS = int(os.environ.get('BULK_UPLOAD_WORKERS', 4))
+    BULK_FILE_TIMEOUT = float(os.environ.get('BULK_FILE_TIMEOUT', 300))
+    REMOTE_CALL_TIMEOUT = float(os.environ.get('REMOTE_CALL_TIMEOUT', 30))
+    REMOTE_CALL_RETRIES = int(os.environ.get('REMOTE_CALL_RETRIES', 2))
+    # Remote OCR/LLM calls: set the rates to your plan's quota (0 disables rate limiting)
+    OCR_SPACE_URL = os.environ.get('OCR_SPACE_URL', 'https://api.ocr.space/parse/image')
+    OCR_SPACE_RATE_PER_MINUTE = float(os.environ.get('OCR_SPACE_RATE_PER_MINUTE', 60))
+    OCR_SPACE_BURST = int(os.environ.get('OCR_SPACE_BURST', 5))
+    OCR_SPACE_MAX_CONCURRENCY = int(os.environ.get('OCR_SPACE_MAX_CONCURRENCY', 4))
+    GEMINI_API_ENDPOINT = os.environ.get('GEMINI_API_ENDPOINT')  # e.g. a local fake server for testing
+    GEMINI_RATE_PER_MINUTE = float(os.environ.get('GEMINI_RATE_PER_MINUTE', 10))
+    GEMINI_BURST = int(os.environ.get('GEMINI_BURST', 5))
+    GEMINI_MAX_CONCURRENCY = int(os.environ.get('GEMINI_MAX_CONCURRENCY', 4))
+    REMOTE_CALL_DEADLINE = float(os.environ.get('REMOTE_CALL_DEADLINE', 120))  # per call, incl. queueing and retries
+    REMOTE_BACKOFF_BASE = float(os.environ.get('REMOTE_BACKOFF_BASE', 0.5))
+    REMOTE_BACKOFF_MAX = float(os.environ.get('REMOTE_BACKOFF_MAX', 10))
+    REMOTE_BREAKER_FAILURES = int(os.environ.get('REMOTE_BREAKER_FAILURES', 5))
+    REMOTE_BREAKER_RESET = float(os.environ.get('REMOTE_BREAKER_RESET', 30))  # seconds before a trial call
+    EXTRACTION_CACHE_MAX_BYTES = int(os.environ.get('EXTRACTION_CACHE_MAX_BYTES', 50 * 1024 * 1024))
+    OCR_BACKEND = os.environ.get('OCR_BACKEND', 'ocrspace')  # 'ocrspace' or 'local'
+    OCR_LANGUAGE = os.environ.get('OCR_LANGUAGE', 'eng')
+    FIELD_EXTRACTOR = os.environ.get('FIELD_EXTRACTOR', 'gemini')  # 'gemini' or 'regex'
+    GEMINI_MODEL = os.environ.get('GEMINI_MODEL', 'gemini-2.5-flash')
+    OCR_PREPROCESS = os.environ.get('OCR_PREPROCESS', '1') == '1'
+    OCR_TARGET_DPI = int(os.environ.get('OCR_TARGET_DPI', 200))
+    OCR_IMAGE_FORMAT = os.environ.get('OCR_IMAGE_FORMAT', 'JPEG')  # 'JPEG' or 'PNG'
+    CHART_CACHE_BACKEND = os.environ.get('CHART_CACHE_BACKEND', 'memory')  # 'memory' or 'redis'
+    CHART_CACHE_TTL = int(os.environ.get('CHART_CACHE_TTL', 300))
+    CHART_CACHE_MAX_ENTRIES = int(os.environ.get('CHART_CACHE_MAX_ENTRIES', 1024))
+    CHART_CACHE_REDIS_URL = os.environ.get('CHART_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    # Comma-separated emails allowed to request ?profile=1 reports
+    ADMIN_EMAILS = [e.strip().lower() for e in os.environ.get('ADMIN_EMAILS', '').split(',') if e.strip()]
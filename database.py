@@ -0,0 +1,56 @@
+# database.py
+import os
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def engine_options(uri, environ=os.environ):
+    """SQLAlchemy engine options for uri, tuned from DB_* environment variables."""
+    url = make_url(uri)
+    options = {'pool_pre_ping': environ.get('DB_POOL_PRE_PING', '1') == '1'}
+    if url.get_backend_name() == 'sqlite':
+        busy_timeout = float(environ.get('DB_BUSY_TIMEOUT', 30))
+        options['connect_args'] = {'timeout': busy_timeout, 'check_same_thread': False}
+        if url.database in (None, '', ':memory:'):
+            # In-memory databases live in a single connection; pool sizing does not apply
+            return options
+    options.update({
+        'pool_size': int(environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': float(environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(environ.get('DB_POOL_RECYCLE', 1800)),
+    })
+    return options
+
+
+def sqlite_pragmas(busy_timeout_ms=30000, synchronous='NORMAL'):
+    """Connect listener enabling WAL so readers never block the single writer, and writers wait
+    for the lock instead of failing with "database is locked"."""
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA synchronous={synchronous}')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+        cursor.close()
+    return on_connect
+
+
+def dialect_insert(bind):
+    """INSERT construct with on_conflict_do_update() for bind's dialect, or None if it has none."""
+    name = bind.dialect.name
+    if name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
+
+def init_db(app, db):
+    db.init_app(app)
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', sqlite_pragmas(app.config['DB_BUSY_TIMEOUT'] * 1000,
+                                                           app.config['SQLITE_SYNCHRONOUS']))
@@ -0,0 +1,42 @@
+# emissions.py
+from models import BillUsage
+from factors import factor_registry, SOURCE_FIELDS, DEFAULT_UNITS
+from metrics import timed
+
+
+@timed('calculate_emissions')
+def calculate_emissions(data):
+    co2_tonnes = 0.0
+    emission_kgco2e = 0.0
+    breakdown = {}
+    for source, (value_key, unit_key) in SOURCE_FIELDS.items():
+        value = data.get(value_key)
+        if value:
+            unit = data.get(unit_key) if unit_key else DEFAULT_UNITS[source]
+            result = factor_registry.emissions(source, value, unit)
+            if result:
+                co2_tonnes += result[0]
+                emission_kgco2e += result[1]
+                breakdown[source] = result
+    return {'co2_tonnes': co2_tonnes, 'emission_kgco2e': emission_kgco2e, 'breakdown': breakdown}
+
+
+def usage_rows(data, breakdown):
+    """Return one BillUsage per source with a quantity in the flat form-shaped data."""
+    rows = []
+    for source, (value_key, unit_key) in SOURCE_FIELDS.items():
+        value = data.get(value_key)
+        if value:
+            co2, kgco2e = breakdown.get(source, (None, None))
+            rows.append(BillUsage(source=source, unit=data.get(unit_key) if unit_key else DEFAULT_UNITS[source],
+                                  value=value, co2_tonnes=co2, kgco2e=kgco2e))
+    return rows
+
+
+def apply_usage(bill, data):
+    """Score form-shaped usage data and store it on bill as totals plus BillUsage rows."""
+    totals = calculate_emissions(data)
+    bill.total_co2_tonnes = totals['co2_tonnes']
+    bill.total_emission_kgco2e = totals['emission_kgco2e']
+    bill.usages = usage_rows(data, totals['breakdown'])
+    return bill
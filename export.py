@@ -0,0 +1,126 @@
+# export.py
+import io
+import csv
+import json
+from sqlalchemy import select
+from models import db, User, BillRecord, BillUsage
+from factors import SOURCE_FIELDS
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+RECORD_COLUMNS = ['id', 'user_id', 'bill_number', 'bill_date', 'billing_period_start', 'billing_period_end',
+                  'uploaded_at', 'total_co2_tonnes', 'total_emission_kgco2e']
+USAGE_COLUMNS = [key for pair in SOURCE_FIELDS.values() for key in pair if key]
+# Usage is exported wide, one value/unit column pair per source, as the edit form shows it
+BILL_COLUMNS = RECORD_COLUMNS[:7] + USAGE_COLUMNS + RECORD_COLUMNS[7:]
+EMISSION_COLUMNS = [f'{source} (kg CO2e)' for source in SOURCE_FIELDS]
+COLUMNS = ['company_name'] + BILL_COLUMNS + EMISSION_COLUMNS
+
+
+def export_batches(user_id=None, start=None, end=None, chunk_size=1000):
+    """Yield lists of export rows (dicts), chunk_size bills at a time, ordered by bill id.
+
+    Rows are streamed from the database with yield_per, so memory use does not grow with the
+    number of bills.
+    """
+    stmt = select(User.company_name, *[getattr(BillRecord, name) for name in RECORD_COLUMNS]) \
+        .join(User, User.id == BillRecord.user_id).order_by(BillRecord.id)
+    if user_id is not None:
+        stmt = stmt.where(BillRecord.user_id == user_id)
+    if start is not None:
+        stmt = stmt.where(BillRecord.bill_date >= start)
+    if end is not None:
+        stmt = stmt.where(BillRecord.bill_date <= end)
+    result = db.session.execute(stmt.execution_options(yield_per=chunk_size))
+    for partition in result.partitions():
+        rows = [dict(row._mapping) for row in partition]
+        for row in rows:
+            row.update(dict.fromkeys(USAGE_COLUMNS))
+            row.update(dict.fromkeys(EMISSION_COLUMNS, 0.0))
+        by_id = {row['id']: row for row in rows}
+        usages = db.session.execute(
+            select(BillUsage.bill_id, BillUsage.source, BillUsage.unit, BillUsage.value, BillUsage.kgco2e)
+            .where(BillUsage.bill_id.in_(by_id)))
+        for bill_id, source, unit, value, kgco2e in usages:
+            if source not in SOURCE_FIELDS:
+                continue
+            row = by_id[bill_id]
+            value_key, unit_key = SOURCE_FIELDS[source]
+            row[value_key] = value
+            if unit_key:
+                row[unit_key] = unit
+            row[f'{source} (kg CO2e)'] = kgco2e or 0.0
+        yield [{name: row[name] for name in COLUMNS} for row in rows]
+
+
+def stream_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS)
+    writer.writeheader()
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def stream_ndjson(batches):
+    for rows in batches:
+        yield ''.join(json.dumps(row, default=str, ensure_ascii=False) + '\n' for row in rows).encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to a generator."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_schema():
+    import pyarrow as pa
+    types = {'company_name': pa.string(), 'id': pa.int64(), 'user_id': pa.int64(), 'bill_number': pa.string(),
+             'bill_date': pa.date32(), 'billing_period_start': pa.date32(), 'billing_period_end': pa.date32(),
+             'uploaded_at': pa.timestamp('us')}
+    return pa.schema([(name, types.get(name, pa.string() if name.endswith('_unit') else pa.float64()))
+                      for name in COLUMNS])
+
+
+def stream_parquet(batches):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for rows in batches:
+        # One row group per batch keeps only a single batch in memory
+        writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def stream_export(fmt, batches):
+    if fmt == 'csv':
+        return stream_csv(batches)
+    if fmt == 'ndjson':
+        return stream_ndjson(batches)
+    if fmt == 'parquet':
+        return stream_parquet(batches)
+    raise ValueError(f"Unknown export format '{fmt}'")
@@ -0,0 +1,98 @@
+# extraction_cache.py
+import json
+import hashlib
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, ExtractionCacheEntry
+from storage import sha256_file
+from database import dialect_insert
+
+
+class ExtractionCache:
+    """SQLite-backed cache of OCR text (keyed by backend and file hash) and parsed extractions (keyed by
+    extractor and text hash).
+
+    Entries are evicted least-recently-used first once their total size exceeds max_bytes. The cache
+    never fails a lookup: an entry that cannot be written just means the next call computes it again.
+    """
+
+    def __init__(self, max_bytes=50 * 1024 * 1024):
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def file_key(path, backend):
+        return f'ocr:{backend}:{sha256_file(path)}'
+
+    @staticmethod
+    def text_key(text, backend):
+        return f"llm:{backend}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def get(self, key):
+        entry = db.session.get(ExtractionCacheEntry, key)
+        if entry is None:
+            return None
+        value = json.loads(entry.payload)
+        entry.last_used_at = datetime.utcnow()
+        try:
+            db.session.commit()
+        except SQLAlchemyError as e:
+            self.write_failed(e)
+        return value
+
+    def put(self, key, value):
+        payload = json.dumps(value)
+        now = datetime.utcnow()
+        row = {'payload': payload, 'size': len(payload.encode('utf-8')), 'last_used_at': now}
+        table = ExtractionCacheEntry.__table__
+        insert = dialect_insert(db.session.get_bind())
+        try:
+            if insert is None:
+                entry = db.session.get(ExtractionCacheEntry, key) or ExtractionCacheEntry(key=key)
+                for column, column_value in row.items():
+                    setattr(entry, column, column_value)
+                db.session.add(entry)
+            else:
+                # Workers that missed the same key at once both write it; the last write wins
+                stmt = insert(table).values(key=key, created_at=now, **row)
+                db.session.execute(stmt.on_conflict_do_update(
+                    index_elements=[table.c.key], set_={column: stmt.excluded[column] for column in row}))
+            db.session.commit()
+        except SQLAlchemyError as e:
+            return self.write_failed(e)
+        self.evict()
+
+    def write_failed(self, error):
+        db.session.rollback()
+        current_app.logger.warning('Extraction cache write failed: %s', error)
+
+    def evict(self):
+        total = db.session.query(func.coalesce(func.sum(ExtractionCacheEntry.size), 0)).scalar()
+        if total <= self.max_bytes:
+            return
+        oldest = db.session.query(ExtractionCacheEntry.key, ExtractionCacheEntry.size) \
+            .order_by(ExtractionCacheEntry.last_used_at)
+        stale = []
+        for key, size in oldest.yield_per(500):
+            if total <= self.max_bytes:
+                break
+            stale.append(key)
+            total -= size
+        try:
+            ExtractionCacheEntry.query.filter(ExtractionCacheEntry.key.in_(stale)).delete(synchronize_session=False)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            self.write_failed(e)
+
+    def cached(self, key, compute):
+        """Return the cached value for key, or compute() it and cache it unless it reports an error."""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            if not value.get('error'):
+                self.put(key, value)
+        return value
+
+
+extraction_cache = ExtractionCache()
@@ -0,0 +1,320 @@
+# extractors.py
+import re
+import json
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from datetime import datetime
+from config import Config
+from forms import unit_choices
+from factors import SOURCE_FIELDS
+from metrics import timed
+from scheduler import ocr_space_scheduler, gemini_scheduler, RemoteCallError, RETRYABLE_STATUS
+
+OCR_SPACE_URL = 'https://api.ocr.space/parse/image'
+# (connect, read) seconds, used when the caller does not pass a timeout
+DEFAULT_TIMEOUT = (10, 120)
+
+_http_session = None
+_gemini_models = {}
+_client_lock = threading.Lock()
+
+
+def http_session():
+    """Process-wide requests.Session so OCR.Space calls reuse keep-alive connections."""
+    global _http_session
+    if _http_session is None:
+        with _client_lock:
+            if _http_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _http_session = session
+    return _http_session
+
+
+def gemini_model(api_key, model_name, endpoint=None):
+    """Return a shared GenerativeModel; google.generativeai is imported and configured on first use.
+
+    endpoint points the REST transport at another server, e.g. a local fake in tests.
+    """
+    key = (api_key, model_name, endpoint)
+    model = _gemini_models.get(key)
+    if model is None:
+        with _client_lock:
+            model = _gemini_models.get(key)
+            if model is None:
+                import google.generativeai as genai
+                if endpoint:
+                    genai.configure(api_key=api_key, transport='rest', client_options={'api_endpoint': endpoint})
+                else:
+                    genai.configure(api_key=api_key)
+                model = _gemini_models[key] = genai.GenerativeModel(model_name)
+    return model
+
+
+def post_ocr_space(url, image_path, payload, timeout):
+    with open(image_path, 'rb') as f:
+        response = http_session().post(url, files={'file': f}, data=payload, timeout=timeout)
+    # Throttling and server errors are retried by the scheduler; other replies carry an error message
+    if response.status_code in RETRYABLE_STATUS:
+        response.raise_for_status()
+    return response
+
+
+@timed('ocr_space')
+def ocr_space_extract(image_path, api_key=Config.OCR_SPACE_API_KEY, language='eng', timeout=None,
+                      url=OCR_SPACE_URL, scheduler=ocr_space_scheduler):
+    try:
+        payload = {
+            'isOverlayRequired': False,
+            'apikey': api_key,
+            'language': language,
+        }
+        response = scheduler.call(post_ocr_space, url, image_path, payload, timeout or DEFAULT_TIMEOUT)
+        result = json.loads(response.content.decode())
+        if result.get('IsErroredOnProcessing', True):
+            error_msg = result.get('ErrorMessage', ['Unknown error'])[0]
+            return {'text': '', 'error': f"OCR.Space error: {error_msg}"}
+        parsed_results = result.get('ParsedResults', [])
+        if not parsed_results:
+            return {'text': '', 'error': 'No parsed results from OCR.Space'}
+        extracted_text = parsed_results[0].get('ParsedText', '')
+        return {'text': extracted_text, 'error': ''}
+    except RemoteCallError as e:
+        return {'text': '', 'error': f"OCR.Space unavailable: {str(e)}"}
+    except Exception as e:
+        return {'text': '', 'error': f"Extraction failed: {str(e)}"}
+
+
+# The prompt lists every source in SOURCE_FIELDS, so new sources need no prompt edits
+PROMPT_SOURCE_NAMES = ', '.join(f"'{source.lower().replace('₂', '2').replace(' value', '')}'" for source in SOURCE_FIELDS)
+USAGE_KEYS_PROMPT = ''.join(
+    f"- {value_key} (float or null)\n" + (f"- {unit_key} (string or \"\")\n" if unit_key else '')
+    for value_key, unit_key in SOURCE_FIELDS.values())
+
+
+@timed('gemini')
+def gemini_extract_details(raw_text, gemini_api_key=Config.GEMINI_API_KEY, timeout=None, model_name='gemini-2.5-flash',
+                           endpoint=None, scheduler=gemini_scheduler):
+    try:
+        model = gemini_model(gemini_api_key, model_name, endpoint)
+        prompt = (
+            "Carefully analyze the bill text to extract the following fields. "
+            f"Identify energy sources based on keywords like {PROMPT_SOURCE_NAMES}. "
+            "For each usage, extract the numerical quantity value (float) and the exact unit mentioned (e.g., '100 kWh' -> value=100.0, unit='kWh'). "
+            "If unit is not explicitly stated, infer it if possible or leave as empty string. "
+            "Search for any dates in the bill (e.g., issue date, due date, billing period) and format them as YYYY-MM-DD. Use the most relevant date as bill_date if multiple are present. "
+            "For billing period, extract start and end dates if available. "
+            "If a field or source is not mentioned or cannot be extracted, use null for numbers/dates and empty string for strings. "
+            "Return strictly as a JSON object with these keys:\n"
+            "- bill_date (string YYYY-MM-DD or null)\n"
+            "- bill_number (string or \"\")\n"
+            f"{USAGE_KEYS_PROMPT}"
+            "- billing_period_start (string YYYY-MM-DD or null)\n"
+            "- billing_period_end (string YYYY-MM-DD or null)\n"
+            f"Text:\n{raw_text}"
+        )
+        response = scheduler.call(model.generate_content, prompt,
+                                  request_options={'timeout': timeout or DEFAULT_TIMEOUT[1]})
+        response_text = response.text.strip()
+        if '```json' in response_text:
+            try:
+                json_str = response_text.split('```json')[1].split('```')[0].strip()
+                extracted = json.loads(json_str)
+            except Exception as e:
+                return {'error': f"Failed to parse Gemini JSON: {str(e)}"}
+        else:
+            try:
+                extracted = json.loads(response_text)
+            except Exception as e:
+                return {'error': f"Failed to parse Gemini response: {str(e)}"}
+        return extracted
+    except RemoteCallError as e:
+        return {'error': f"Gemini unavailable: {str(e)}"}
+    except Exception as e:
+        return {'error': f"Gemini API failed: {str(e)}"}
+
+
+# Local OCR: PDF text layers are read directly; scans and images go through Tesseract.
+
+MIN_TEXT_LAYER_CHARS = 20
+
+
+def pdf_text_layer(pdf_path):
+    from PyPDF2 import PdfReader
+    reader = PdfReader(pdf_path)
+    return '\n'.join(page.extract_text() or '' for page in reader.pages)
+
+
+def tesseract_extract(image, language='eng', timeout=None):
+    import pytesseract
+    return pytesseract.image_to_string(image, lang=language, timeout=timeout or 0)
+
+
+@timed('local_ocr')
+def local_ocr_extract(file_path, language='eng', timeout=None, dpi=200):
+    try:
+        if file_path.lower().endswith('.pdf'):
+            text = pdf_text_layer(file_path)
+            if len(text.strip()) >= MIN_TEXT_LAYER_CHARS:
+                return {'text': text, 'error': ''}
+            from pdf2image import convert_from_path
+            pages = convert_from_path(file_path, dpi=dpi)
+            text = '\n'.join(tesseract_extract(page, language, timeout) for page in pages)
+        else:
+            from PIL import Image
+            with Image.open(file_path) as image:
+                text = tesseract_extract(image, language, timeout)
+        if not text.strip():
+            return {'text': '', 'error': 'No text found in bill'}
+        return {'text': text, 'error': ''}
+    except ImportError as e:
+        return {'text': '', 'error': f"Local OCR unavailable: {str(e)}"}
+    except Exception as e:
+        return {'text': '', 'error': f"Extraction failed: {str(e)}"}
+
+
+# Rule-based field extraction for the ten energy sources
+
+NUMBER = r'(\d[\d,]*(?:\.\d+)?)'
+UNIT_ALIASES = {
+    'kWh': r'kwh|kw\s?h|units?',
+    'liters': r'litres?|liters?|ltrs?|l\b',
+    'm3': r'm3|m³|cu\.?\s?m|cubic\s+met(?:er|re)s?|scm',
+    'kg': r'kgs?|kilograms?',
+    'tons': r'tonnes?|tons?|mt\b|t\b',
+}
+SOURCE_KEYWORDS = {
+    'Electricity': r'electricity|energy\s+consumption|units\s+consumed|power',
+    'Water': r'water',
+    'Methane': r'methane|ch4',
+    'Oil': r'fuel\s+oil|furnace\s+oil|crude\s+oil|lubricating\s+oil|\boil',
+    'Coal': r'coal',
+    'Industrial Waste': r'industrial\s+waste|waste',
+    'Trade CO₂ Value': r'trade\s+co2|traded\s+co2|co2\s+trade|carbon\s+credits?',
+    'Natural Gas': r'natural\s+gas|\bcng\b|\bpng\b|\bgas\b',
+    'Petrol': r'petrol|gasoline|\bms\b',
+    'Diesel': r'diesel|\bhsd\b',
+}
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%d %b %Y', '%d %B %Y', '%b %d, %Y', '%B %d, %Y')
+DATE_PATTERN = (r'(\d{4}-\d{2}-\d{2}|\d{1,2}[/.-]\d{1,2}[/.-]\d{4}|\d{1,2}\s+[A-Za-z]{3,9}\s+\d{4}'
+                r'|[A-Za-z]{3,9}\s+\d{1,2},\s+\d{4})')
+
+
+def normalise_date(text):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text.strip(), fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return None
+
+
+def find_date(text, labels):
+    match = re.search(rf'(?:{labels})\s*[:\-]?\s*{DATE_PATTERN}', text, re.IGNORECASE)
+    return normalise_date(match.group(1)) if match else None
+
+
+def find_usage(text, source, units):
+    """Return (value, unit) for the first keyword followed by a quantity in one of units."""
+    unit_pattern = '|'.join(f'(?P<u{i}>{UNIT_ALIASES[unit]})' for i, unit in enumerate(units))
+    pattern = rf'(?:{SOURCE_KEYWORDS[source]})[^\d\n]{{0,60}}?{NUMBER}\s*(?:{unit_pattern})'
+    if source == 'Trade CO₂ Value':
+        pattern += '?'
+    for match in re.finditer(pattern, text, re.IGNORECASE):
+        value = float(match.group(1).replace(',', ''))
+        unit = next((units[i] for i in range(len(units)) if match.group(f'u{i}')), units[0])
+        return value, unit
+    return None, ''
+
+
+@timed('regex_extract')
+def regex_extract_details(raw_text, timeout=None):
+    extracted = {
+        'bill_date': find_date(raw_text, r'bill\s+date|invoice\s+date|date\s+of\s+issue|issue\s+date|date'),
+        'bill_number': '',
+        'billing_period_start': None,
+        'billing_period_end': None,
+    }
+    number = re.search(r'(?:bill|invoice|receipt)\s*(?:no\.?|number|#)\s*[:\-#]?\s*([A-Z0-9][A-Z0-9/\-]*)',
+                       raw_text, re.IGNORECASE)
+    if number:
+        extracted['bill_number'] = number.group(1)
+    period = re.search(rf'{DATE_PATTERN}\s*(?:to|till|until|-|–)\s*{DATE_PATTERN}', raw_text, re.IGNORECASE)
+    if period:
+        extracted['billing_period_start'] = normalise_date(period.group(1))
+        extracted['billing_period_end'] = normalise_date(period.group(2))
+    for source, (value_key, unit_key) in SOURCE_FIELDS.items():
+        units = unit_choices(unit_key) if unit_key else ['tons']
+        value, unit = find_usage(raw_text, source, units)
+        extracted[value_key] = value
+        if unit_key:
+            extracted[unit_key] = unit
+    return extracted
+
+
+# Backends selectable through Config.OCR_BACKEND and Config.FIELD_EXTRACTOR. Every OCR backend is
+# called as ocr(file_path, timeout=None) -> {'text', 'error'}, and every field extractor as
+# extractor(raw_text, timeout=None) -> dict of bill fields or {'error'}. The remote backends go
+# through the provider schedulers in scheduler.py, which handle rate limits and retries.
+
+class OcrSpaceBackend:
+    def __init__(self, api_key=None, language='eng', url=OCR_SPACE_URL):
+        self.api_key = api_key
+        self.language = language
+        self.url = url
+        self.cache_name = f'ocrspace:{language}'
+
+    def __call__(self, file_path, timeout=None):
+        return ocr_space_extract(file_path, api_key=self.api_key, language=self.language, timeout=timeout,
+                                 url=self.url)
+
+
+class LocalOcrBackend:
+    def __init__(self, language='eng'):
+        self.language = language
+        self.cache_name = f'local:{language}'
+
+    def __call__(self, file_path, timeout=None):
+        return local_ocr_extract(file_path, language=self.language, timeout=timeout)
+
+
+class GeminiExtractor:
+    def __init__(self, api_key=None, model_name='gemini-2.5-flash', endpoint=None):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.endpoint = endpoint
+        self.cache_name = f'gemini:{model_name}'
+
+    def __call__(self, raw_text, timeout=None):
+        return gemini_extract_details(raw_text, gemini_api_key=self.api_key, timeout=timeout,
+                                      model_name=self.model_name, endpoint=self.endpoint)
+
+
+class RegexExtractor:
+    cache_name = 'regex'
+
+    def __call__(self, raw_text, timeout=None):
+        return regex_extract_details(raw_text, timeout=timeout)
+
+
+def make_ocr_backend(config):
+    name = config.get('OCR_BACKEND', 'ocrspace')
+    if name == 'ocrspace':
+        return OcrSpaceBackend(config.get('OCR_SPACE_API_KEY'), language=config.get('OCR_LANGUAGE', 'eng'),
+                               url=config.get('OCR_SPACE_URL', OCR_SPACE_URL))
+    if name == 'local':
+        return LocalOcrBackend(config.get('OCR_LANGUAGE', 'eng'))
+    raise ValueError(f"Unknown OCR_BACKEND '{name}'")
+
+
+def make_field_extractor(config):
+    name = config.get('FIELD_EXTRACTOR', 'gemini')
+    if name == 'gemini':
+        return GeminiExtractor(config.get('GEMINI_API_KEY'), config.get('GEMINI_MODEL', 'gemini-2.5-flash'),
+                               config.get('GEMINI_API_ENDPOINT'))
+    if name == 'regex':
+        return RegexExtractor()
+    raise ValueError(f"Unknown FIELD_EXTRACTOR '{name}'")
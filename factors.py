@@ -0,0 +1,157 @@
+# factors.py
+import os
+import csv
+import threading
+from bisect import bisect_right
+from metrics import span
+
+FACTORS_CSV = 'emission_factors.csv'
+
+# Form field pairs for every energy source; a unit field of None means a fixed unit.
+SOURCE_FIELDS = {
+    'Electricity': ('electricity_usage_value', 'electricity_usage_unit'),
+    'Water': ('water_usage_value', 'water_usage_unit'),
+    'Methane': ('methane_usage_value', 'methane_usage_unit'),
+    'Oil': ('oil_usage_value', 'oil_usage_unit'),
+    'Coal': ('coal_usage_value', 'coal_usage_unit'),
+    'Industrial Waste': ('industrial_waste_value', 'industrial_waste_unit'),
+    'Trade CO₂ Value': ('trade_co2_value', None),
+    'Natural Gas': ('natural_gas_usage_value', 'natural_gas_usage_unit'),
+    'Petrol': ('petrol_usage_value', 'petrol_usage_unit'),
+    'Diesel': ('diesel_usage_value', 'diesel_usage_unit'),
+}
+SOURCES_LIST = list(SOURCE_FIELDS.keys())
+DEFAULT_UNITS = {'Trade CO₂ Value': 'tons'}
+# Source names as spelled in the CSV, where they differ from the display names above
+CSV_SOURCE_NAMES = {'Trade CO2 Value': 'Trade CO₂ Value'}
+
+# Multipliers from a form unit to another unit of the same source. Mass <-> volume conversions
+# use typical densities: methane 0.717 kg/m3, natural gas 0.8 kg/m3, oil 0.88 kg/L,
+# petrol 0.74 kg/L, diesel 0.835 kg/L.
+GENERIC_CONVERSIONS = {
+    ('m3', 'liters'): 1000.0,
+    ('liters', 'm3'): 0.001,
+    ('tons', 'kg'): 1000.0,
+    ('tonnes', 'kg'): 1000.0,
+    ('kg', 'tons'): 0.001,
+    ('kg', 'tonnes'): 0.001,
+    ('tons', 'tonnes'): 1.0,
+    ('tonnes', 'tons'): 1.0,
+}
+SOURCE_CONVERSIONS = {
+    ('Methane', 'kg', 'm3'): 1 / 0.717,
+    ('Natural Gas', 'kg', 'm3'): 1 / 0.8,
+    ('Oil', 'kg', 'liters'): 1 / 0.88,
+    ('Petrol', 'kg', 'liters'): 1 / 0.74,
+    ('Diesel', 'kg', 'liters'): 1 / 0.835,
+}
+
+
+def unit_multiplier(source, from_unit, to_unit):
+    if from_unit == to_unit:
+        return 1.0
+    return SOURCE_CONVERSIONS.get((source, from_unit, to_unit), GENERIC_CONVERSIONS.get((from_unit, to_unit)))
+
+
+class FactorCurve:
+    """Emission totals for one (source, unit) sampled at known quantities.
+
+    Quantities are kept sorted so a lookup is a binary search plus linear interpolation between the
+    neighbouring samples (anchored at zero). Beyond the largest sample the least-squares per-unit
+    coefficient is used.
+    """
+
+    def __init__(self, samples):
+        samples = sorted(samples)
+        self.quantities = [0.0] + [q for q, _, _ in samples]
+        self.co2 = [0.0] + [c for _, c, _ in samples]
+        self.kgco2e = [0.0] + [k for _, _, k in samples]
+        sum_qq = sum(q * q for q, _, _ in samples)
+        self.co2_per_unit = sum(q * c for q, c, _ in samples) / sum_qq
+        self.kgco2e_per_unit = sum(q * k for q, _, k in samples) / sum_qq
+
+    def emissions(self, quantity):
+        """Return (co2_tonnes, kgco2e) for a quantity in this curve's unit."""
+        if quantity >= self.quantities[-1] or quantity < 0:
+            return quantity * self.co2_per_unit, quantity * self.kgco2e_per_unit
+        i = bisect_right(self.quantities, quantity)
+        q0, q1 = self.quantities[i - 1], self.quantities[i]
+        t = (quantity - q0) / (q1 - q0) if q1 != q0 else 0.0
+        return (self.co2[i - 1] + t * (self.co2[i] - self.co2[i - 1]),
+                self.kgco2e[i - 1] + t * (self.kgco2e[i] - self.kgco2e[i - 1]))
+
+    def emissions_array(self, quantities):
+        """Vectorised emissions() over a NumPy array of quantities."""
+        import numpy as np
+        quantities = np.asarray(quantities, dtype=np.float64)
+        beyond = (quantities >= self.quantities[-1]) | (quantities < 0)
+        co2 = np.where(beyond, quantities * self.co2_per_unit, np.interp(quantities, self.quantities, self.co2))
+        kgco2e = np.where(beyond, quantities * self.kgco2e_per_unit,
+                          np.interp(quantities, self.quantities, self.kgco2e))
+        return co2, kgco2e
+
+
+class FactorRegistry:
+    """Parses the emission factor CSV once into per-(source, unit) curves; reloads on mtime change."""
+
+    def __init__(self, path=FACTORS_CSV):
+        self.path = path
+        self._curves = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        samples = {}
+        with open(self.path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                source = CSV_SOURCE_NAMES.get(row['Energy Source'], row['Energy Source'])
+                quantity = float(row['Quantity'])
+                if quantity <= 0:
+                    continue
+                samples.setdefault((source, row['Unit']), []).append(
+                    (quantity, float(row['CO2 Emission (tonnes)']), float(row['Carbon Footprint Value (kg CO2e)'])))
+        return {key: FactorCurve(rows) for key, rows in samples.items()}
+
+    def curves(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return self._curves
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    with span('factor_csv_load'):
+                        self._curves = self._load()
+                    self._mtime = mtime
+        return self._curves
+
+    def resolve(self, source, unit):
+        """Return (curve, multiplier) converting unit into a unit the CSV has a curve for, or None."""
+        curves = self.curves()
+        if (source, unit) in curves:
+            return curves[(source, unit)], 1.0
+        for (curve_source, curve_unit), curve in curves.items():
+            if curve_source == source:
+                multiplier = unit_multiplier(source, unit, curve_unit)
+                if multiplier is not None:
+                    return curve, multiplier
+        return None
+
+    def emissions(self, source, value, unit):
+        """Return (co2_tonnes, kgco2e) for a usage value, or None if there is no factor."""
+        resolved = self.resolve(source, unit)
+        if resolved is None:
+            return None
+        curve, multiplier = resolved
+        return curve.emissions(value * multiplier)
+
+    def emissions_array(self, source, unit, values):
+        """Vectorised emissions() for many values sharing one (source, unit); None if no factor."""
+        resolved = self.resolve(source, unit)
+        if resolved is None:
+            return None
+        curve, multiplier = resolved
+        return curve.emissions_array(values * multiplier)
+
+
+factor_registry = FactorRegistry()
@@ -1,6 +1,6 @@
 # forms.py
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, FileField, DateField, FloatField, SelectField, HiddenField
+from wtforms import StringField, PasswordField, SubmitField, FileField, MultipleFileField, DateField, FloatField, SelectField, HiddenField
 from wtforms.validators import DataRequired, Email, EqualTo, Optional
 
 class RegistrationForm(FlaskForm):
@@ -20,6 +20,10 @@ class BillUploadForm(FlaskForm):
     bill_file = FileField('Upload Bill', validators=[DataRequired()])
     submit = SubmitField('Process Bill')
 
+class BulkBillUploadForm(FlaskForm):
+    bill_files = MultipleFileField('Upload Bills (images, PDFs or a zip archive)', validators=[DataRequired()])
+    submit = SubmitField('Process Bills')
+
 class BillEditForm(FlaskForm):
     bill_file_path = HiddenField()
     bill_date = DateField('Bill Date', validators=[Optional()])
@@ -45,4 +49,9 @@ class BillEditForm(FlaskForm):
     diesel_usage_unit = SelectField('Unit', choices=[('liters', 'liters'), ('kg', 'kg')], validators=[Optional()])
     billing_period_start = DateField('Billing Period Start', validators=[Optional()])
     billing_period_end = DateField('Billing Period End', validators=[Optional()])
-    submit = SubmitField('Save')
\ No newline at end of file
+    submit = SubmitField('Save')
+
+
+def unit_choices(unit_key):
+    """Unit values BillEditForm offers for a source's unit field, e.g. ['liters', 'm3'] for water_usage_unit."""
+    return [value for value, _ in getattr(BillEditForm, unit_key).kwargs['choices']]
@@ -0,0 +1,129 @@
+# jobs.py
+import json
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func
+from models import db, BillJob
+
+UNFINISHED = ('queued', 'running')
+STALE_JOB_ERROR = 'Bill processing was interrupted. Please upload the bill again.'
+
+
+class JobQueue:
+    """Runs the bill extraction pipeline on a worker pool outside the request cycle.
+
+    Jobs only live in this process's pool, so jobs left queued or running by a restart are picked
+    up again when the next process serves its first request (see recover_stale).
+    """
+
+    def __init__(self, app=None, pipeline=None):
+        self.app = None
+        self.pipeline = pipeline
+        self.executor = None
+        self.stale_after = timedelta(minutes=10)
+        self._recovered = False
+        self._recover_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, pipeline)
+
+    def init_app(self, app, pipeline=None):
+        self.app = app
+        if pipeline is not None:
+            self.pipeline = pipeline
+        if self.executor is not None:
+            # Re-initialised for another app: let the old pool finish its work and exit
+            self.executor.shutdown(wait=False)
+        self.executor = ThreadPoolExecutor(max_workers=app.config.get('JOB_WORKERS', 4),
+                                           thread_name_prefix='bill-job')
+        self.stale_after = timedelta(seconds=app.config.get('JOB_STALE_SECONDS', 600))
+        self._recovered = False
+        # Not at startup: CLI commands build the app too and must not start processing jobs
+        app.before_request(self.recover_once)
+        app.extensions['job_queue'] = self
+
+    def enqueue(self, user_id, bill_file_path):
+        job = BillJob(user_id=user_id, bill_file_path=bill_file_path, status='queued')
+        db.session.add(job)
+        db.session.commit()
+        self.executor.submit(self.run, job.id)
+        return job
+
+    def stale_cutoff(self):
+        return datetime.utcnow() - self.stale_after
+
+    def is_stale(self, job):
+        return job.status in UNFINISHED and (job.started_at or job.created_at) < self.stale_cutoff()
+
+    def recover_once(self):
+        if self._recovered:
+            return
+        with self._recover_lock:
+            if not self._recovered:
+                self._recovered = True
+                self.recover_stale()
+
+    def recover_stale(self):
+        """Re-submit unfinished jobs with no progress for stale_after, e.g. after a restart.
+
+        Each job is claimed with a conditional UPDATE, so with several worker processes only one
+        of them re-submits it. Returns the ids re-submitted.
+        """
+        cutoff = self.stale_cutoff()
+        last_activity = func.coalesce(BillJob.started_at, BillJob.created_at)
+        stale_ids = [job_id for (job_id,) in db.session.query(BillJob.id)
+                     .filter(BillJob.status.in_(UNFINISHED), last_activity < cutoff)]
+        claimed = []
+        for job_id in stale_ids:
+            updated = BillJob.query.filter(BillJob.id == job_id, BillJob.status.in_(UNFINISHED),
+                                           last_activity < cutoff) \
+                .update({'status': 'queued', 'started_at': datetime.utcnow()}, synchronize_session=False)
+            if updated:
+                claimed.append(job_id)
+        db.session.commit()
+        for job_id in claimed:
+            self.executor.submit(self.run, job_id)
+        return claimed
+
+    def expire_if_stale(self, job):
+        """Fail a job that stopped making progress, so its status page stops polling."""
+        if self.is_stale(job):
+            job.status = 'failed'
+            job.error = STALE_JOB_ERROR
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+        return job
+
+    def run(self, job_id):
+        with self.app.app_context():
+            job = db.session.get(BillJob, job_id)
+            # Skip jobs failed as stale while they waited in the pool
+            if job is None or job.status != 'queued':
+                return
+            job.status = 'running'
+            job.started_at = datetime.utcnow()
+            db.session.commit()
+            stats = {}
+            try:
+                result = self.pipeline(job.bill_file_path, stats=stats)
+            except Exception as e:
+                result = {'error': f"Bill processing failed: {str(e)}"}
+            job.original_bytes = stats.get('original_bytes')
+            job.processed_bytes = stats.get('processed_bytes')
+            job.ocr_ms = stats.get('ocr_ms')
+            if result.get('error'):
+                job.status = 'failed'
+                job.error = result['error']
+            else:
+                job.status = 'done'
+                job.result = json.dumps(result)
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            db.session.remove()
+
+
+def job_result(job):
+    return json.loads(job.result) if job.result else {}
+
+
+job_queue = JobQueue()
@@ -0,0 +1,189 @@
+# metrics.py
+import io
+import time
+import pstats
+import cProfile
+import threading
+import functools
+from contextlib import contextmanager
+from flask import g, request, has_request_context, make_response
+from sqlalchemy import event
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _label_str(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in sorted(labels)) + '}'
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(key, {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series['counts']):
+                    lines.append(f'{self.name}_bucket{_label_str(key + (("le", bound),))} {count}')
+                lines.append(f'{self.name}_bucket{_label_str(key + (("le", "+Inf"),))} {series["count"]}')
+                lines.append(f'{self.name}_sum{_label_str(key)} {series["sum"]}')
+                lines.append(f'{self.name}_count{_label_str(key)} {series["count"]}')
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time."""
+
+    def __init__(self, name, help_text, callback, metric_type='gauge'):
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+        self.metric_type = metric_type
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.metric_type}']
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in sorted(values.items()):
+            lines.append(f'{self.name}{_label_str(key)} {value}')
+        return lines
+
+
+span_seconds = Histogram('carbonranker_span_seconds', 'Time spent in instrumented hot-path spans.')
+request_seconds = Histogram('carbonranker_request_seconds', 'HTTP request latency by endpoint.')
+request_queries = Histogram('carbonranker_request_sql_queries', 'SQL queries issued per HTTP request.',
+                            QUERY_COUNT_BUCKETS)
+query_seconds = Histogram('carbonranker_sql_query_seconds', 'SQL query execution time.')
+collectors = [span_seconds, request_seconds, request_queries, query_seconds]
+
+
+def register_gauge(name, help_text, callback, metric_type='gauge'):
+    collectors.append(Gauge(name, help_text, callback, metric_type))
+
+
+def render_metrics():
+    lines = []
+    for collector in collectors:
+        lines.extend(collector.render())
+    return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def span(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        span_seconds.observe(elapsed, span=name)
+        if has_request_context():
+            g.setdefault('spans', []).append((name, elapsed))
+
+
+def timed(name):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_start'].pop()
+    query_seconds.observe(time.perf_counter() - started)
+    if has_request_context():
+        g.sql_queries = g.get('sql_queries', 0) + 1
+
+
+def profile_report(profiler, limit=60):
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out).strip_dirs().sort_stats('cumulative')
+    stats.print_stats(limit)
+    return out.getvalue()
+
+
+class Instrumentation:
+    """Request timing, per-request SQL query counting, /metrics and admin ?profile=1 reports."""
+
+    def __init__(self, app=None, db=None, is_admin=None):
+        self.is_admin = is_admin or (lambda: False)
+        if app is not None:
+            self.init_app(app, db, is_admin)
+
+    def init_app(self, app, db, is_admin=None):
+        if is_admin is not None:
+            self.is_admin = is_admin
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        app.extensions['instrumentation'] = self
+
+    def before_request(self):
+        g.request_started = time.perf_counter()
+        g.sql_queries = 0
+        if request.args.get('profile') == '1' and self.is_admin():
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    def after_request(self, response):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+        elapsed = time.perf_counter() - g.get('request_started', time.perf_counter())
+        endpoint = request.endpoint or 'unmatched'
+        if endpoint != 'metrics':
+            request_seconds.observe(elapsed, endpoint=endpoint)
+            request_queries.observe(g.get('sql_queries', 0), endpoint=endpoint)
+        response.headers['X-SQL-Queries'] = str(g.get('sql_queries', 0))
+        if profiler is None:
+            return response
+        totals = {}
+        for name, seconds in g.get('spans', []):
+            count, total = totals.get(name, (0, 0.0))
+            totals[name] = (count + 1, total + seconds)
+        spans = ''.join(f'  {name:<28} {count:>5} calls {total * 1000:10.2f} ms\n'
+                        for name, (count, total) in sorted(totals.items(), key=lambda item: -item[1][1]))
+        report = (f'{request.method} {request.full_path} -> {response.status}\n'
+                  f'Total {elapsed * 1000:.2f} ms, {g.get("sql_queries", 0)} SQL queries\n\n'
+                  'Spans:\n' + (spans or '  (none)\n') + '\n' + profile_report(profiler))
+        profiled = make_response(report, 200)
+        profiled.mimetype = 'text/plain'
+        return profiled
+
+    def metrics_view(self):
+        response = make_response(render_metrics())
+        response.mimetype = 'text/plain'
+        response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+        return response
+
+
+instrumentation = Instrumentation()
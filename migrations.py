@@ -0,0 +1,170 @@
+# migrations.py
+"""Versioned schema migrations.
+
+Each migration is a function registered with @migration(version, name) and runs once, in version
+order; applied versions are recorded in the schema_migrations table. Migrations must be safe on
+both a fresh database (where version 1 has already created every current table) and an old one,
+so they check for what they add before adding it. New schema changes get a new, higher version
+here instead of relying on db.create_all().
+"""
+from datetime import datetime
+from sqlalchemy import inspect, text, Table, Column, Integer, String, DateTime, MetaData
+from models import db, BillRecord, BillUsage, BillJob, CompanyEmissionSummary, EmissionRollup, \
+    ExtractionCacheEntry
+from factors import factor_registry, SOURCE_FIELDS, DEFAULT_UNITS
+from scoring import rebuild_summaries
+from rollups import rebuild_rollups
+
+MIGRATIONS = []
+schema_migrations = Table(
+    'schema_migrations', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+def migration(version, name):
+    def decorator(fn):
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return decorator
+
+
+def add_missing_columns(connection, table, columns):
+    existing = {column['name'] for column in inspect(connection).get_columns(table.name)}
+    for column in columns:
+        if column.name not in existing:
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+
+@migration(1, 'create missing tables')
+def create_tables(connection):
+    db.metadata.create_all(connection)
+
+
+@migration(2, 'bill_record per-user indexes')
+def bill_record_indexes(connection):
+    for index in BillRecord.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+
+@migration(3, 'bill_job preprocessing stats')
+def bill_job_stats(connection):
+    add_missing_columns(connection, BillJob.__table__,
+                        [BillJob.__table__.c.original_bytes, BillJob.__table__.c.processed_bytes,
+                         BillJob.__table__.c.ocr_ms])
+
+
+@migration(4, 'backfill emission summaries')
+def backfill_summaries(connection):
+    # Per-source breakdowns are filled in by migration 5 along with the usage rows
+    if BillRecord.query.first() and not CompanyEmissionSummary.query.first():
+        rebuild_summaries()
+
+
+@migration(5, 'move wide bill_record usage columns into bill_usage')
+def bill_usage_from_columns(connection, chunk_size=5000):
+    BillUsage.__table__.create(connection, checkfirst=True)
+    inspector = inspect(connection)
+    existing = {column['name'] for column in inspector.get_columns(BillRecord.__tablename__)}
+    sources = [(source, value_key, unit_key) for source, (value_key, unit_key) in SOURCE_FIELDS.items()
+               if value_key in existing]
+    if sources:
+        columns = [key for _, value_key, unit_key in sources for key in (value_key, unit_key) if key]
+        select = text(f"SELECT id, {', '.join(columns)} FROM {BillRecord.__tablename__} "
+                      "WHERE id > :last_id ORDER BY id LIMIT :limit")
+        last_id = 0
+        while True:
+            bills = connection.execute(select, {'last_id': last_id, 'limit': chunk_size}).mappings().all()
+            if not bills:
+                break
+            rows = []
+            for bill in bills:
+                for source, value_key, unit_key in sources:
+                    value = bill[value_key]
+                    if not value:
+                        continue
+                    unit = bill[unit_key] if unit_key else DEFAULT_UNITS[source]
+                    co2, kgco2e = factor_registry.emissions(source, value, unit) or (None, None)
+                    rows.append({'bill_id': bill['id'], 'source': source, 'unit': unit, 'value': value,
+                                 'co2_tonnes': co2, 'kgco2e': kgco2e})
+            if rows:
+                connection.execute(BillUsage.__table__.insert(), rows)
+            last_id = bills[-1]['id']
+        for column in columns:
+            connection.execute(text(f'ALTER TABLE {BillRecord.__tablename__} DROP COLUMN {column}'))
+        # The usage rows were priced with the current factor curves; bring the stored totals in line
+        for total, column in (('total_co2_tonnes', 'co2_tonnes'), ('total_emission_kgco2e', 'kgco2e')):
+            connection.execute(text(
+                f'UPDATE {BillRecord.__tablename__} SET {total} = (SELECT COALESCE(SUM({column}), 0) '
+                f'FROM {BillUsage.__tablename__} WHERE bill_id = {BillRecord.__tablename__}.id)'))
+    if 'bill_emission_line' in inspector.get_table_names():
+        connection.execute(text('DROP TABLE bill_emission_line'))
+    if sources and CompanyEmissionSummary.query.first():
+        # Summaries backfilled by migration 4 still hold the old totals. This commits, so it goes last.
+        rebuild_summaries()
+
+
+@migration(6, 'emission rollups')
+def emission_rollups(connection):
+    EmissionRollup.__table__.create(connection, checkfirst=True)
+    if BillRecord.query.first() and not EmissionRollup.query.first():
+        rebuild_rollups()
+
+
+@migration(7, 'company scores computed at read time')
+def drop_stored_scores(connection):
+    table = CompanyEmissionSummary.__tablename__
+    inspector = inspect(connection)
+    if 'score' in {column['name'] for column in inspector.get_columns(table)}:
+        # SQLite refuses to drop an indexed column
+        for index in inspector.get_indexes(table):
+            if 'score' in index['column_names']:
+                connection.execute(text(f"DROP INDEX {index['name']}"))
+        connection.execute(text(f'ALTER TABLE {table} DROP COLUMN score'))
+    for index in CompanyEmissionSummary.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+
+@migration(8, 'extraction cache keys include the backend')
+def longer_cache_keys(connection):
+    # Keys such as 'llm:gemini:gemini-2.5-flash:<sha256>' outgrow VARCHAR(80); SQLite does not enforce lengths
+    if connection.dialect.name == 'postgresql':
+        table = ExtractionCacheEntry.__tablename__
+        connection.execute(text(f'ALTER TABLE {table} ALTER COLUMN key TYPE VARCHAR(200)'))
+
+
+def applied_versions():
+    with db.engine.begin() as connection:
+        schema_migrations.create(connection, checkfirst=True)
+        return {version for (version,) in connection.execute(schema_migrations.select()
+                                                                .with_only_columns(schema_migrations.c.version))}
+
+
+def pending_migrations():
+    applied = applied_versions()
+    return [(version, name) for version, name, _ in MIGRATIONS if version not in applied]
+
+
+def upgrade(log=print):
+    """Apply pending migrations in order, each in its own transaction. Returns the versions applied."""
+    applied = applied_versions()
+    done = []
+    for version, name, fn in MIGRATIONS:
+        if version in applied:
+            continue
+        log(f'Applying migration {version}: {name}')
+        # Data migrations use the ORM session, so schema and data changes share its connection
+        try:
+            fn(db.session.connection())
+            db.session.execute(schema_migrations.insert().values(version=version, name=name,
+                                                                 applied_at=datetime.utcnow()))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        done.append(version)
+    return done
@@ -35,32 +35,84 @@ class User(db.Model):
         return str(self.id)
 
 class BillRecord(db.Model):
+    __table_args__ = (
+        db.Index('ix_bill_record_user_bill_date', 'user_id', 'bill_date'),
+        db.Index('ix_bill_record_user_uploaded_at', 'user_id', 'uploaded_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     bill_date = db.Column(db.Date)
     bill_number = db.Column(db.String(50))
-    electricity_usage_value = db.Column(db.Float)
-    electricity_usage_unit = db.Column(db.String(20))
-    water_usage_value = db.Column(db.Float)
-    water_usage_unit = db.Column(db.String(20))
-    methane_usage_value = db.Column(db.Float)
-    methane_usage_unit = db.Column(db.String(20))
-    oil_usage_value = db.Column(db.Float)
-    oil_usage_unit = db.Column(db.String(20))
-    coal_usage_value = db.Column(db.Float)
-    coal_usage_unit = db.Column(db.String(20))
-    industrial_waste_value = db.Column(db.Float)
-    industrial_waste_unit = db.Column(db.String(20))
-    trade_co2_value = db.Column(db.Float)
-    natural_gas_usage_value = db.Column(db.Float)
-    natural_gas_usage_unit = db.Column(db.String(20))
-    petrol_usage_value = db.Column(db.Float)
-    petrol_usage_unit = db.Column(db.String(20))
-    diesel_usage_value = db.Column(db.Float)
-    diesel_usage_unit = db.Column(db.String(20))
     billing_period_start = db.Column(db.Date)
     billing_period_end = db.Column(db.Date)
     total_co2_tonnes = db.Column(db.Float, default=0.0)
     total_emission_kgco2e = db.Column(db.Float, default=0.0)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
-    bill_file_path = db.Column(db.String(200))
\ No newline at end of file
+    bill_file_path = db.Column(db.String(200))
+    usages = db.relationship('BillUsage', backref='bill', lazy='select', cascade='all, delete-orphan',
+                             order_by='BillUsage.id')
+
+
+class BillUsage(db.Model):
+    """One energy source on a bill: the quantity as billed and the emissions it was scored at.
+
+    Emission columns are NULL when no factor curve covers the source/unit.
+    """
+    __table_args__ = (
+        db.Index('ix_bill_usage_source_bill', 'source', 'bill_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    bill_id = db.Column(db.Integer, db.ForeignKey('bill_record.id'), nullable=False, index=True)
+    source = db.Column(db.String(50), nullable=False)
+    unit = db.Column(db.String(20))
+    value = db.Column(db.Float, nullable=False)
+    co2_tonnes = db.Column(db.Float)
+    kgco2e = db.Column(db.Float)
+
+class CompanyEmissionSummary(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total_emission = db.Column(db.Float, default=0.0, nullable=False, index=True)
+    bill_count = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class BillJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    bill_file_path = db.Column(db.String(200))
+    status = db.Column(db.String(20), default='queued', nullable=False)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    original_bytes = db.Column(db.Integer)
+    processed_bytes = db.Column(db.Integer)
+    ocr_ms = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+
+class ExtractionCacheEntry(db.Model):
+    key = db.Column(db.String(200), primary_key=True)
+    payload = db.Column(db.Text, nullable=False)
+    size = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class EmissionRollup(db.Model):
+    """Precomputed emissions per company and period, kept up to date as bills are recorded.
+
+    user_id 0 holds the totals across all companies. granularity is 'month' (period 'YYYY-MM'),
+    'year' ('YYYY') or 'all' (period ''); undated bills only count towards 'all'. Rows with an empty
+    source are the bill totals, the others the per-source breakdown.
+    """
+    __table_args__ = (
+        db.Index('ix_emission_rollup_granularity_source_period', 'granularity', 'source', 'period'),
+    )
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    granularity = db.Column(db.String(5), primary_key=True)
+    period = db.Column(db.String(7), primary_key=True)
+    source = db.Column(db.String(50), primary_key=True)
+    kgco2e = db.Column(db.Float, default=0.0, nullable=False)
+    co2_tonnes = db.Column(db.Float, default=0.0, nullable=False)
+    bill_count = db.Column(db.Integer, default=0, nullable=False)
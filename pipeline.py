@@ -0,0 +1,63 @@
+# pipeline.py
+import os
+import time
+from functools import partial
+from extraction_cache import extraction_cache
+from preprocess import preprocess_for_ocr
+
+
+def cache_name(backend):
+    """Name a backend's results are cached under, so switching backend or model does not reuse them."""
+    return getattr(backend, 'cache_name', type(backend).__name__)
+
+
+class BillPipeline:
+    """OCR followed by field extraction for one app, with both results cached by content."""
+
+    def __init__(self, app, ocr, llm):
+        self.app = app
+        self.ocr = ocr
+        self.llm = llm
+
+    @property
+    def ocr_name(self):
+        return cache_name(self.ocr)
+
+    @property
+    def llm_name(self):
+        return cache_name(self.llm)
+
+    def with_backends(self, ocr=None, llm=None):
+        """Return a pipeline callable using other OCR/LLM callables, e.g. wrapped with retries."""
+        return partial(self, ocr=ocr or self.ocr, llm=llm or self.llm)
+
+    def run_ocr(self, file_path, ocr, stats):
+        config = self.app.config
+        ocr_path = file_path
+        if config['OCR_PREPROCESS']:
+            ocr_path, preprocess_stats = preprocess_for_ocr(file_path, config['OCR_TARGET_DPI'],
+                                                            config['OCR_IMAGE_FORMAT'])
+            stats.update(preprocess_stats)
+        started = time.perf_counter()
+        try:
+            return ocr(ocr_path)
+        finally:
+            stats['ocr_ms'] = (time.perf_counter() - started) * 1000
+            if ocr_path != file_path:
+                os.remove(ocr_path)
+            self.app.logger.info('OCR %s: %s -> %s bytes in %.0f ms', os.path.basename(file_path),
+                                 stats.get('original_bytes'), stats.get('processed_bytes'), stats['ocr_ms'])
+
+    def __call__(self, file_path, ocr=None, llm=None, stats=None):
+        ocr = ocr or self.ocr
+        llm = llm or self.llm
+        stats = {} if stats is None else stats
+        # Re-uploads of the same file, or files with the same OCR text, skip the remote calls
+        with self.app.app_context():
+            ocr_result = extraction_cache.cached(extraction_cache.file_key(file_path, self.ocr_name),
+                                                 lambda: self.run_ocr(file_path, ocr, stats))
+            if ocr_result['error']:
+                return {'error': ocr_result['error']}
+            raw_text = ocr_result['text']
+            return extraction_cache.cached(extraction_cache.text_key(raw_text, self.llm_name),
+                                         lambda: llm(raw_text))
@@ -0,0 +1,61 @@
+# preprocess.py
+import os
+import tempfile
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tif', '.tiff', '.webp'}
+# Bills without DPI metadata are assumed to be one A4/Letter page wide
+ASSUMED_PAGE_WIDTH_INCHES = 8.5
+BORDER_THRESHOLD = 245
+
+
+def crop_borders(image):
+    """Trim near-white margins from a grayscale image."""
+    mask = image.point(lambda p: 255 if p < BORDER_THRESHOLD else 0)
+    bbox = mask.getbbox()
+    return image.crop(bbox) if bbox else image
+
+
+def preprocess_for_ocr(file_path, target_dpi=200, image_format='JPEG', quality=80):
+    """Downscale, grayscale, crop and re-encode an image bill into a temporary file.
+
+    Returns (path, stats); path is the original file when it is not an image or could not be
+    shrunk, otherwise a temporary file the caller must remove.
+    """
+    original_bytes = os.path.getsize(file_path)
+    stats = {'original_bytes': original_bytes, 'processed_bytes': original_bytes}
+    if os.path.splitext(file_path)[1].lower() not in IMAGE_EXTENSIONS:
+        return file_path, stats
+    try:
+        from PIL import Image, ImageOps, UnidentifiedImageError
+    except ImportError:
+        return file_path, stats
+    try:
+        with Image.open(file_path) as image:
+            source_dpi = (image.info.get('dpi') or (0, 0))[0] or image.width / ASSUMED_PAGE_WIDTH_INCHES
+            scale = min(1.0, target_dpi / source_dpi)
+            target_size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+            # JPEG decoding can be reduced at load time instead of after a full-size decode
+            image.draft('L', target_size)
+            # Phone photos are often stored sideways with an EXIF Orientation tag, which re-encoding drops
+            oriented = ImageOps.exif_transpose(image)
+            if oriented.size != image.size:
+                target_size = target_size[::-1]
+            processed = crop_borders(oriented.convert('L'))
+            if scale < 1.0:
+                processed.thumbnail(target_size, Image.LANCZOS)
+    except (UnidentifiedImageError, OSError):
+        # Leave unreadable or truncated images for the OCR backend to accept or reject
+        return file_path, stats
+    fd, out_path = tempfile.mkstemp(suffix='.jpg' if image_format == 'JPEG' else '.png',
+                                    dir=os.path.dirname(file_path))
+    with os.fdopen(fd, 'wb') as out:
+        if image_format == 'JPEG':
+            processed.save(out, 'JPEG', quality=quality, optimize=True)
+        else:
+            processed.save(out, 'PNG', optimize=True)
+    processed_bytes = os.path.getsize(out_path)
+    if processed_bytes >= original_bytes:
+        os.remove(out_path)
+        return file_path, stats
+    stats['processed_bytes'] = processed_bytes
+    return out_path, stats
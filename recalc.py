@@ -0,0 +1,60 @@
+# recalc.py
+import time
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from models import db, BillRecord, BillUsage
+from factors import factor_registry
+
+
+def recalculate_chunk(bill_ids, usage):
+    """Return (totals, usage) frames: usage rows with fresh emission columns, totals per bill id."""
+    usage = usage.copy()
+    usage['co2_tonnes'] = np.nan
+    usage['kgco2e'] = np.nan
+    # One vectorised factor-curve evaluation per (source, unit) group
+    for (source, unit), group in usage.groupby(['source', 'unit'], dropna=False).groups.items():
+        unit = None if pd.isna(unit) else unit
+        result = factor_registry.emissions_array(source, unit, usage.loc[group, 'value'].to_numpy(dtype=np.float64))
+        if result is not None:
+            usage.loc[group, 'co2_tonnes'], usage.loc[group, 'kgco2e'] = result
+    totals = usage.groupby('bill_id')[['co2_tonnes', 'kgco2e']].sum() \
+        .reindex(bill_ids, fill_value=0.0)
+    return totals, usage
+
+
+def recalculate_emissions(chunk_size=5000, log=print):
+    """Recompute stored usage emissions and bill totals for every bill against the current factor curves.
+
+    Bills are read in id-ordered chunks (keyset pagination) so memory stays bounded; each chunk is
+    written back with executemany and committed before the next is read.
+    """
+    select_bills = text(f"SELECT id FROM {BillRecord.__tablename__} WHERE id > :last_id ORDER BY id LIMIT :limit")
+    select_usage = text(f"SELECT id, bill_id, source, unit, value FROM {BillUsage.__tablename__} "
+                        "WHERE bill_id BETWEEN :first_id AND :last_id")
+    update_usage = text(f"UPDATE {BillUsage.__tablename__} SET co2_tonnes = :co2_tonnes, kgco2e = :kgco2e "
+                        "WHERE id = :id")
+    update_bill = text(f"UPDATE {BillRecord.__tablename__} SET total_co2_tonnes = :co2_tonnes, "
+                       "total_emission_kgco2e = :kgco2e WHERE id = :bill_id")
+    processed = 0
+    last_id = 0
+    started = time.perf_counter()
+    with db.engine.connect() as conn:
+        while True:
+            bill_ids = [bill_id for (bill_id,) in conn.execute(select_bills, {'last_id': last_id,
+                                                                               'limit': chunk_size})]
+            if not bill_ids:
+                break
+            first_id, last_id = bill_ids[0], bill_ids[-1]
+            usage = pd.read_sql_query(select_usage, conn, params={'first_id': first_id, 'last_id': last_id})
+            totals, usage = recalculate_chunk(bill_ids, usage)
+            if not usage.empty:
+                rows = usage[['id', 'co2_tonnes', 'kgco2e']].astype(object)
+                conn.execute(update_usage, rows.where(rows.notna(), None).to_dict('records'))
+            conn.execute(update_bill, totals.reset_index(names='bill_id').to_dict('records'))
+            conn.commit()
+            processed += len(bill_ids)
+            elapsed = time.perf_counter() - started
+            log(f'{processed} bills recalculated ({processed / elapsed:.0f} rows/sec)')
+    elapsed = time.perf_counter() - started
+    return processed, elapsed
@@ -0,0 +1,168 @@
+# rollups.py
+"""Monthly, yearly and all-time emission totals per company and across all companies.
+
+record_rollups() adds a bill to its rows in the same transaction that saves the bill, so charts and
+trend pages read a handful of rollup rows instead of aggregating every bill a company ever uploaded.
+rebuild_rollups() recomputes the whole table from bill_record and bill_usage.
+"""
+from datetime import datetime
+from sqlalchemy import func, literal
+from models import db, BillRecord, BillUsage, EmissionRollup, CompanyEmissionSummary
+from aggregates import month_key, year_key
+from database import dialect_insert
+
+ALL_COMPANIES = 0  # user_id of the rows summed over every company
+TOTAL = ''         # source of the rows holding bill totals
+GRANULARITIES = ('month', 'year', 'all')
+KEY_COLUMNS = ('user_id', 'granularity', 'period', 'source')
+VALUE_COLUMNS = ('kgco2e', 'co2_tonnes', 'bill_count')
+
+
+def bill_periods(bill_date):
+    """(granularity, period) pairs a bill dated bill_date counts towards."""
+    if bill_date is None:
+        return [('all', '')]
+    return [('month', bill_date.strftime('%Y-%m')), ('year', bill_date.strftime('%Y')), ('all', '')]
+
+
+def rollup_rows(bill):
+    """Rollup increments for one bill: its totals and each priced usage row, per period, for the
+    bill's company and for all companies."""
+    amounts = [(TOTAL, bill.total_emission_kgco2e or 0.0, bill.total_co2_tonnes or 0.0)]
+    amounts += [(usage.source, usage.kgco2e, usage.co2_tonnes or 0.0)
+                for usage in bill.usages if usage.kgco2e is not None]
+    return [{'user_id': user_id, 'granularity': granularity, 'period': period, 'source': source,
+             'kgco2e': kgco2e, 'co2_tonnes': co2_tonnes, 'bill_count': 1}
+            for user_id in (bill.user_id, ALL_COMPANIES)
+            for granularity, period in bill_periods(bill.bill_date)
+            for source, kgco2e, co2_tonnes in amounts]
+
+
+def upsert_rollups(rows):
+    """Add rows onto existing rollup rows, inserting missing ones, in one executemany statement."""
+    if not rows:
+        return
+    table = EmissionRollup.__table__
+    insert = dialect_insert(db.session.get_bind())
+    if insert is None:
+        return upsert_rollups_orm(rows)
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c[key] for key in KEY_COLUMNS],
+        set_={column: table.c[column] + stmt.excluded[column] for column in VALUE_COLUMNS})
+    db.session.execute(stmt, rows)
+
+
+def upsert_rollups_orm(rows):
+    # Databases without INSERT ... ON CONFLICT: read-modify-write through the session
+    db.session.flush()
+    for row in rows:
+        key = tuple(row[column] for column in KEY_COLUMNS)
+        rollup = db.session.get(EmissionRollup, key)
+        if rollup is None:
+            db.session.add(EmissionRollup(**row))
+            db.session.flush()
+            continue
+        for column in VALUE_COLUMNS:
+            setattr(rollup, column, getattr(rollup, column) + row[column])
+
+
+def record_rollups(bills):
+    """Fold new BillRecords (with their usage rows) into the rollups within the current transaction."""
+    rows = {}
+    for bill in bills:
+        for row in rollup_rows(bill):
+            key = tuple(row[column] for column in KEY_COLUMNS)
+            if key in rows:
+                for column in VALUE_COLUMNS:
+                    rows[key][column] += row[column]
+            else:
+                rows[key] = row
+    upsert_rollups(list(rows.values()))
+
+
+def rollup_selects():
+    """INSERT ... SELECT sources for every (company scope, granularity, totals/per-source) combination."""
+    periods = {'month': month_key(), 'year': year_key()}
+    for granularity in GRANULARITIES:
+        period = periods.get(granularity)
+        dated = [BillRecord.bill_date.isnot(None)] if period is not None else []
+        period_group = [period] if period is not None else []
+        period = period if period is not None else literal('')
+        for per_company in (True, False):
+            user_id = BillRecord.user_id if per_company else literal(ALL_COMPANIES)
+            group_by = ([BillRecord.user_id] if per_company else []) + period_group
+            yield db.select(user_id, literal(granularity), period, literal(TOTAL),
+                            func.coalesce(func.sum(BillRecord.total_emission_kgco2e), 0.0),
+                            func.coalesce(func.sum(BillRecord.total_co2_tonnes), 0.0),
+                            func.count(BillRecord.id)) \
+                .where(*dated).group_by(*group_by)
+            yield db.select(user_id, literal(granularity), period, BillUsage.source,
+                            func.sum(BillUsage.kgco2e), func.coalesce(func.sum(BillUsage.co2_tonnes), 0.0),
+                            func.count(BillUsage.bill_id)) \
+                .join(BillRecord, BillRecord.id == BillUsage.bill_id) \
+                .where(BillUsage.kgco2e.isnot(None), *dated).group_by(*group_by, BillUsage.source)
+
+
+def rebuild_rollups():
+    """Recompute every rollup row from the bill tables. Returns the number of rows written."""
+    table = EmissionRollup.__table__
+    db.session.execute(table.delete())
+    for select in rollup_selects():
+        db.session.execute(table.insert().from_select(KEY_COLUMNS + VALUE_COLUMNS, select))
+    # Cached dashboard charts are keyed by the summary row (charts.chart_version); move every company on
+    db.session.execute(CompanyEmissionSummary.__table__.update().values(updated_at=datetime.utcnow()))
+    db.session.commit()
+    return db.session.query(func.count()).select_from(table).scalar()
+
+
+def series(user_id, granularity, source=TOTAL):
+    """(period, kgco2e) tuples ordered by period for one company (or ALL_COMPANIES) and source."""
+    return db.session.query(EmissionRollup.period, EmissionRollup.kgco2e) \
+        .filter_by(user_id=user_id, granularity=granularity, source=source) \
+        .order_by(EmissionRollup.period).all()
+
+
+def source_series(user_id, granularity):
+    """(period, source, kgco2e) tuples for every source of one company, excluding the totals."""
+    return db.session.query(EmissionRollup.period, EmissionRollup.source, EmissionRollup.kgco2e) \
+        .filter(EmissionRollup.user_id == user_id, EmissionRollup.granularity == granularity,
+                EmissionRollup.source != TOTAL) \
+        .order_by(EmissionRollup.period).all()
+
+
+def pct_change(current, previous):
+    return round((current - previous) / previous * 100, 2) if previous else None
+
+
+def year_over_year(user_id):
+    """Yearly totals with the change from the previous calendar year and a 12-month breakdown."""
+    months = {}
+    for period, kgco2e in series(user_id, 'month'):
+        months.setdefault(period[:4], [0.0] * 12)[int(period[5:7]) - 1] = kgco2e
+    yearly = dict(series(user_id, 'year'))
+    return [{
+        'year': year,
+        'kgco2e': total,
+        'change_pct': pct_change(total, yearly.get(str(int(year) - 1))),
+        'monthly': months.get(year, [0.0] * 12),
+    } for year, total in yearly.items()]
+
+
+def sector_monthly_averages(user_id=None):
+    """Average monthly emissions per reporting company, optionally alongside user_id's own total.
+
+    A company counts towards a month's average only if it has a bill dated in that month.
+    """
+    companies = dict(db.session.query(EmissionRollup.period, func.count(EmissionRollup.user_id))
+                     .filter(EmissionRollup.granularity == 'month', EmissionRollup.source == TOTAL,
+                             EmissionRollup.user_id != ALL_COMPANIES)
+                     .group_by(EmissionRollup.period).all())
+    own = dict(series(user_id, 'month')) if user_id is not None else {}
+    return [{
+        'month': month,
+        'companies': companies.get(month, 0),
+        'total_kgco2e': total,
+        'average_kgco2e': total / companies[month] if companies.get(month) else 0.0,
+        'company_kgco2e': own.get(month),
+    } for month, total in series(ALL_COMPANIES, 'month')]
@@ -0,0 +1,280 @@
+# scheduler.py
+"""Client-side scheduling of calls to rate-limited remote APIs (OCR.Space, Gemini).
+
+Each provider has a RemoteScheduler combining a token bucket sized to the provider's quota, a cap on
+calls in flight, retries of transient failures with exponential backoff and full jitter, and a
+circuit breaker that fails calls at once while the provider keeps failing. A call gives up after
+`deadline` seconds in total, so a provider slowdown turns into a prompt error instead of hung uploads.
+"""
+import time
+import random
+import threading
+from contextlib import contextmanager
+import requests
+from metrics import Histogram, collectors, register_gauge
+
+# Timeouts, throttling and server errors; other 4xx responses are not worth retrying
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+
+schedulers = {}
+
+
+class RemoteCallError(Exception):
+    """The call was not made: the provider's circuit is open or no slot freed up before the deadline."""
+
+
+class CircuitOpen(RemoteCallError):
+    pass
+
+
+class QueueTimeout(RemoteCallError):
+    pass
+
+
+def status_code(exc):
+    """HTTP status of a requests HTTPError or google.api_core error, if any."""
+    status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    if status is None:
+        status = getattr(exc, 'code', None)
+    return status if isinstance(status, int) else None
+
+
+def is_transient(exc):
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError)):
+        return True
+    return status_code(exc) in RETRYABLE_STATUS
+
+
+def retry_after(exc):
+    headers = getattr(getattr(exc, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Allows `rate` calls per second on average with bursts of up to `capacity`.
+
+    acquire() reserves the next token, so waiting callers are served in order; it returns False
+    without taking a token if that would mean waiting longer than timeout.
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+            if timeout is not None and wait > timeout:
+                return False
+            self.tokens -= 1
+        if wait:
+            self.sleep(wait)
+        return True
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive transient failures and rejects calls while open.
+
+    After reset_timeout seconds a single trial call is let through (half-open); success closes the
+    circuit, another failure opens it again.
+    """
+    CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def retry_in(self):
+        """Seconds until an open circuit lets a trial call through; 0 if calls are allowed now."""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - self.clock())
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.retry_in() > 0:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial = False
+            if self.state == self.HALF_OPEN:
+                if self._trial:
+                    return False
+                self._trial = True
+            return True
+
+    def cancel_trial(self):
+        """Give up a trial call allow() granted but that never ran, so the next caller can make it."""
+        with self._lock:
+            self._trial = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+            self._trial = False
+
+
+class RemoteScheduler:
+    """Runs calls to one provider within its rate limit, concurrency cap and circuit breaker."""
+
+    def __init__(self, name, rate_per_minute=60, burst=5, max_concurrency=4, retries=2, backoff=0.5,
+                 max_backoff=10.0, deadline=120.0, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.waiting = 0
+        self.in_flight = 0
+        self.outcomes = {}
+        self._lock = threading.Lock()
+        self.configure(rate_per_minute, burst, max_concurrency, retries, backoff, max_backoff, deadline,
+                       failure_threshold, reset_timeout)
+        schedulers[name] = self
+
+    def configure(self, rate_per_minute, burst, max_concurrency, retries, backoff, max_backoff, deadline,
+                  failure_threshold, reset_timeout):
+        # A rate of 0 turns rate limiting off
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst) if rate_per_minute else None
+        self.max_concurrency = max_concurrency
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+    def init_app(self, app, prefix):
+        config = app.config
+        self.configure(config[f'{prefix}_RATE_PER_MINUTE'], config[f'{prefix}_BURST'],
+                       config[f'{prefix}_MAX_CONCURRENCY'], config['REMOTE_CALL_RETRIES'],
+                       config['REMOTE_BACKOFF_BASE'], config['REMOTE_BACKOFF_MAX'],
+                       config['REMOTE_CALL_DEADLINE'], config['REMOTE_BREAKER_FAILURES'],
+                       config['REMOTE_BREAKER_RESET'])
+        app.extensions.setdefault('remote_schedulers', {})[self.name] = self
+
+    def _count(self, outcome):
+        with self._lock:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def backoff_delay(self, attempt, server_delay=None):
+        """Full-jitter exponential backoff, never shorter than a server-provided Retry-After."""
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        return max(delay, server_delay) if server_delay else delay
+
+    @contextmanager
+    def _slot(self, deadline):
+        """Wait for a free concurrency slot and a rate-limit token, up to the call's deadline.
+
+        The circuit breaker is asked before taking a token, so calls it rejects do not use up the quota.
+        """
+        started = time.monotonic()
+        with self._lock:
+            self.waiting += 1
+        try:
+            if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                raise QueueTimeout(f'{self.name}: no free slot within {self.deadline:g}s')
+            if not self.breaker.allow():
+                self._slots.release()
+                self._count('rejected')
+                raise CircuitOpen(f'{self.name} is failing; a trial call is in progress')
+            if self.bucket and not self.bucket.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                self.breaker.cancel_trial()
+                self._slots.release()
+                raise QueueTimeout(f'{self.name}: rate limit leaves no room within {self.deadline:g}s')
+        except QueueTimeout:
+            self._count('queue_timeout')
+            raise
+        finally:
+            with self._lock:
+                self.waiting -= 1
+            queue_wait_seconds.observe(time.monotonic() - started, provider=self.name)
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def call(self, fn, *args, **kwargs):
+        """Return fn(*args, **kwargs), retrying transient failures.
+
+        Raises CircuitOpen or QueueTimeout if fn could not be run, otherwise fn's last error.
+        """
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.retries + 1):
+            if self.breaker.retry_in() > 0:
+                self._count('rejected')
+                raise CircuitOpen(f'{self.name} is failing; retry in {self.breaker.retry_in():.1f}s')
+            with self._slot(deadline):
+                started = time.perf_counter()
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception as exc:
+                    transient = is_transient(exc)
+                    call_seconds.observe(time.perf_counter() - started, provider=self.name,
+                                         outcome='transient_error' if transient else 'error')
+                    if not transient:
+                        # The provider answered; the request itself was bad
+                        self.breaker.record_success()
+                        self._count('error')
+                        raise
+                    self.breaker.record_failure()
+                    error = exc
+                else:
+                    call_seconds.observe(time.perf_counter() - started, provider=self.name, outcome='ok')
+                    self.breaker.record_success()
+                    self._count('ok')
+                    return result
+            delay = self.backoff_delay(attempt, retry_after(error))
+            if attempt == self.retries or time.monotonic() + delay > deadline:
+                break
+            self._count('retry')
+            time.sleep(delay)
+        self._count('failed')
+        raise error
+
+
+call_seconds = Histogram('carbonranker_remote_call_seconds', 'Latency of remote OCR/LLM calls by provider.')
+queue_wait_seconds = Histogram('carbonranker_remote_queue_wait_seconds',
+                               'Time remote calls waited for a concurrency slot and rate-limit token.')
+collectors.extend([call_seconds, queue_wait_seconds])
+register_gauge('carbonranker_remote_queue_depth', 'Remote calls waiting for a slot or token.',
+               lambda: {(('provider', name),): s.waiting for name, s in schedulers.items()})
+register_gauge('carbonranker_remote_in_flight', 'Remote calls in progress.',
+               lambda: {(('provider', name),): s.in_flight for name, s in schedulers.items()})
+register_gauge('carbonranker_remote_circuit_open', '1 while the provider circuit breaker rejects calls.',
+               lambda: {(('provider', name),): int(s.breaker.state != CircuitBreaker.CLOSED)
+                        for name, s in schedulers.items()})
+register_gauge('carbonranker_remote_calls_total', 'Remote call attempts and rejections by outcome.',
+               lambda: {(('outcome', outcome), ('provider', name)): count
+                        for name, s in schedulers.items() for outcome, count in s.outcomes.items()},
+               'counter')
+
+# Defaults are replaced from the app config by init_app()
+ocr_space_scheduler = RemoteScheduler('ocrspace')
+gemini_scheduler = RemoteScheduler('gemini')
@@ -0,0 +1,113 @@
+# scoring.py
+from datetime import datetime
+from sqlalchemy import func, case, or_
+from models import db, User, CompanyEmissionSummary
+from aggregates import emission_totals_by_user
+from rollups import record_rollups
+from metrics import timed
+from database import dialect_insert
+
+# Scores are percentiles, which move whenever any company's total changes or a company registers,
+# so they are computed when read instead of being stored on every summary row.
+
+
+class SummaryRanks:
+    """Ranks a company total against the stored summaries with one COUNT on the total_emission index."""
+
+    def __init__(self):
+        # Companies without bills count as zero emission in the percentile.
+        self.company_count = User.query.count()
+
+    def rank(self, total_emission):
+        # Number of companies that emit strictly more than total_emission
+        return CompanyEmissionSummary.query.filter(CompanyEmissionSummary.total_emission > total_emission).count()
+
+
+def percentile_score(rank, company_count, bill_count):
+    emission_score = rank / company_count * 100
+    bill_bonus = min(bill_count * 5, 25)
+    score = emission_score + bill_bonus
+    return max(0, min(100, round(score, 2)))
+
+
+@timed('compute_score')
+def compute_score(total_emission, bill_count, index=None):
+    # Return 0 if no bills uploaded
+    if bill_count == 0 or not total_emission:
+        return 0
+    index = index or SummaryRanks()
+    if not index.company_count:
+        return 0
+    return percentile_score(index.rank(total_emission), index.company_count, bill_count)
+
+
+def company_score(user_id):
+    summary = db.session.get(CompanyEmissionSummary, user_id)
+    return compute_score(summary.total_emission, summary.bill_count) if summary else 0
+
+
+def record_bill(bill):
+    """Fold a new BillRecord into its company's summary and the emission rollups within the current
+    transaction. The summary is updated with a single upsert, so concurrent saves cannot lose counts."""
+    emission = bill.total_emission_kgco2e or 0.0
+    table = CompanyEmissionSummary.__table__
+    insert = dialect_insert(db.session.get_bind())
+    if insert is None:
+        # Databases without INSERT ... ON CONFLICT: read-modify-write through the session
+        summary = db.session.get(CompanyEmissionSummary, bill.user_id)
+        if summary is None:
+            summary = CompanyEmissionSummary(user_id=bill.user_id, total_emission=0.0, bill_count=0)
+            db.session.add(summary)
+        summary.total_emission += emission
+        summary.bill_count += 1
+    else:
+        stmt = insert(table).values(user_id=bill.user_id, total_emission=emission, bill_count=1,
+                                    updated_at=datetime.utcnow())
+        db.session.execute(stmt.on_conflict_do_update(index_elements=[table.c.user_id], set_={
+            'total_emission': table.c.total_emission + stmt.excluded.total_emission,
+            'bill_count': table.c.bill_count + stmt.excluded.bill_count,
+            'updated_at': stmt.excluded.updated_at,
+        }))
+    record_rollups([bill])
+
+
+def rebuild_summaries():
+    """Rebuild every summary row from the bill table, e.g. for a database created before summaries existed."""
+    CompanyEmissionSummary.query.delete()
+    rows = emission_totals_by_user()
+    db.session.add_all([CompanyEmissionSummary(user_id=user_id, total_emission=total, bill_count=count)
+                        for user_id, total, count in rows])
+    db.session.commit()
+    return len(rows)
+
+
+def leaderboard_entries(offset=0, limit=None):
+    """Return ranked leaderboard rows, sorted by score (descending) then total emission (ascending).
+
+    Each company's rank comes from a rank() window over the summaries; scores match compute_score().
+    """
+    company_count = User.query.count()
+    if not company_count:
+        return []
+    above = func.rank().over(order_by=CompanyEmissionSummary.total_emission.desc()) - 1
+    ranked = db.session.query(CompanyEmissionSummary.user_id, CompanyEmissionSummary.total_emission,
+                              CompanyEmissionSummary.bill_count, above.label('above')).subquery()
+    total_emission = func.coalesce(ranked.c.total_emission, 0)
+    bill_count = func.coalesce(ranked.c.bill_count, 0)
+    raw_score = ranked.c.above * 100.0 / company_count + case((bill_count > 5, 25), else_=bill_count * 5)
+    score = case((or_(bill_count == 0, total_emission == 0), 0), (raw_score > 100, 100),
+                 else_=func.round(raw_score, 2))
+    query = db.session.query(User.id, User.company_name, User.logo_path, total_emission, bill_count, ranked.c.above) \
+        .outerjoin(ranked, ranked.c.user_id == User.id) \
+        .order_by(score.desc(), total_emission.asc(), User.id).offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    return [{
+        'rank': idx,
+        'user_id': user_id,
+        'company_name': company_name,
+        'score': percentile_score(above, company_count, bill_count) if bill_count and total_emission else 0,
+        'total_emission': total_emission,
+        'logo_path': logo_path
+    } for idx, (user_id, company_name, logo_path, total_emission, bill_count, above)
+        in enumerate(query, start=offset + 1)]
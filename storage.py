@@ -0,0 +1,75 @@
+# storage.py
+import os
+import re
+import hashlib
+import tempfile
+
+CHUNK_SIZE = 64 * 1024
+CONTENT_ADDRESSED_NAME = re.compile(r'^[0-9a-f]{64}(\.|$)')
+
+
+class FileTooLarge(ValueError):
+    pass
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def shard_dir(directory, sha):
+    """Two levels of 256 subdirectories (ab/cd/abcd....ext) keep directory listings small."""
+    return os.path.join(directory, sha[:2], sha[2:4])
+
+
+def is_content_addressed(path):
+    return bool(CONTENT_ADDRESSED_NAME.match(os.path.basename(path)))
+
+
+def upload_relpath(path, upload_folder, subdir):
+    """Path of a stored upload relative to upload_folder, as used in /uploads/ URLs.
+
+    Bare file names (e.g. the default logo) are looked up in subdir.
+    """
+    if os.path.dirname(path):
+        relpath = os.path.relpath(path, upload_folder)
+        if not relpath.startswith('..'):
+            return relpath.replace(os.sep, '/')
+    return f'{subdir}/{os.path.basename(path)}'
+
+
+def save_content_addressed(stream, directory, filename, max_bytes=None, shard=True):
+    """Stream a file in CHUNK_SIZE pieces into directory, named by its SHA-256 so identical uploads
+    share one copy and different files with the same name never overwrite each other.
+
+    Raises FileTooLarge once more than max_bytes have been read. Returns (path, sha256_hex).
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    digest = hashlib.sha256()
+    size = 0
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as dst:
+            while chunk := stream.read(CHUNK_SIZE):
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise FileTooLarge(f'{filename} is larger than {max_bytes / (1024 * 1024):g} MB')
+                digest.update(chunk)
+                dst.write(chunk)
+        sha = digest.hexdigest()
+        target_dir = shard_dir(directory, sha) if shard else directory
+        os.makedirs(target_dir, exist_ok=True)
+        path = os.path.join(target_dir, sha + ext)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path, sha
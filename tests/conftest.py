@@ -0,0 +1,104 @@
+# tests/conftest.py
+import os
+import sys
+import pytest
+from werkzeug.security import generate_password_hash
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from config import Config  # noqa: E402
+from database import engine_options  # noqa: E402
+from migrations import upgrade  # noqa: E402
+from models import db, User  # noqa: E402
+
+PASSWORD = 'password'
+
+
+class StubOcr:
+    """Stand-in for the OCR backend: returns canned text (or an error) and records the files it saw."""
+
+    def __init__(self, text='Electricity consumed 1000 kWh', error=''):
+        self.text = text
+        self.error = error
+        self.calls = []
+
+    def __call__(self, file_path, timeout=None):
+        self.calls.append(file_path)
+        return {'text': '' if self.error else self.text, 'error': self.error}
+
+
+class StubExtractor:
+    """Stand-in for the field extractor (Gemini)."""
+
+    def __init__(self, fields=None):
+        self.fields = fields if fields is not None else {
+            'bill_date': '2025-03-14',
+            'bill_number': 'INV-42',
+            'electricity_usage_value': 1000.0,
+            'electricity_usage_unit': 'kWh',
+        }
+        self.calls = []
+
+    def __call__(self, raw_text, timeout=None):
+        self.calls.append(raw_text)
+        return dict(self.fields)
+
+
+def make_app(tmp_path):
+    """App on a SQLite database at tmp_path/test.db, which may already exist; no migrations are run."""
+    uri = 'sqlite:///' + str(tmp_path / 'test.db')
+
+    class TestConfig(Config):
+        SQLALCHEMY_DATABASE_URI = uri
+        SQLALCHEMY_ENGINE_OPTIONS = engine_options(uri)
+        UPLOAD_FOLDER = str(tmp_path / 'uploads')
+        WTF_CSRF_ENABLED = False
+        AUTO_MIGRATE = False
+        OCR_PREPROCESS = False
+        CHART_CACHE_BACKEND = 'memory'
+
+    return create_app(TestConfig)
+
+
+def close_app(app):
+    app.extensions['job_queue'].executor.shutdown(wait=True)
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(tmp_path)
+    with app.app_context():
+        upgrade(log=lambda message: None)
+    yield app
+    close_app(app)
+
+
+@pytest.fixture
+def stubs(app):
+    """Swap the app's OCR and field extractor for local stand-ins."""
+    pipeline = app.extensions['bill_pipeline']
+    pipeline.ocr = StubOcr()
+    pipeline.llm = StubExtractor()
+    return pipeline
+
+
+@pytest.fixture
+def user(app):
+    with app.app_context():
+        user = User(company_name='Acme', email='acme@example.com',
+                    password_hash=generate_password_hash(PASSWORD))
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def client(app, user):
+    client = app.test_client()
+    response = client.post('/login', data={'email': 'acme@example.com', 'password': PASSWORD})
+    assert response.status_code == 302
+    return client
@@ -0,0 +1,46 @@
+# tests/test_bulk.py
+import io
+import zipfile
+import pytest
+from werkzeug.datastructures import FileStorage
+from bulk import save_bulk_files, bill_data
+
+
+def zip_bytes(**members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def test_corrupt_zip_is_rejected(tmp_path):
+    files = [FileStorage(io.BytesIO(b'not really a zip'), 'bills.zip'),
+             FileStorage(io.BytesIO(zip_bytes(**{'march.png': b'march bill'})), 'good.zip')]
+    saved, rejected = save_bulk_files(files, str(tmp_path))
+    assert [name for name, _ in saved] == ['march.png']
+    assert rejected == [('bills.zip', 'Not a valid zip archive')]
+
+
+@pytest.mark.parametrize('unit, expected', [('litres', 'liters'), ('L', 'liters'), ('Liters', 'liters'),
+                                            ('m³', 'm3'), ('cubic metres', 'm3')])
+def test_bill_data_accepts_unit_aliases(unit, expected):
+    data = bill_data({'water_usage_value': 12.5, 'water_usage_unit': unit})
+    assert data['water_usage_value'] == 12.5
+    assert data['water_usage_unit'] == expected
+
+
+def test_bill_data_rejects_unknown_unit():
+    with pytest.raises(ValueError, match="Unrecognised unit 'gallons'"):
+        bill_data({'water_usage_value': 3, 'water_usage_unit': 'gallons'})
+
+
+def test_copies_in_one_upload_are_extracted_once(client, stubs):
+    files = [(io.BytesIO(b'january bill'), 'jan.png'), (io.BytesIO(b'january bill'), 'jan-copy.png')]
+    response = client.post('/upload/bulk', data={'bill_files': files}, content_type='multipart/form-data',
+                           headers={'Accept': 'application/json'})
+    report = response.get_json()
+    assert report['saved'] == 2 and report['failed'] == 0, report
+    assert [entry['filename'] for entry in report['files']] == ['jan.png', 'jan-copy.png']
+    assert len(stubs.ocr.calls) == 1
+    assert len(stubs.llm.calls) == 1
@@ -0,0 +1,34 @@
+# tests/test_charts.py
+from models import db, BillRecord
+from bulk import bill_data, build_bill
+from charts import dashboard_data
+from rollups import rebuild_rollups
+from scoring import record_bill
+
+
+def save_bill(user_id, bill_date, kwh):
+    """Save a bill the way another worker would, without touching this process's chart cache."""
+    bill = build_bill(user_id, bill_data({'bill_date': bill_date, 'electricity_usage_value': kwh,
+                                          'electricity_usage_unit': 'kWh'}), None)
+    db.session.add(bill)
+    record_bill(bill)
+    db.session.commit()
+    return bill
+
+
+def test_cached_charts_follow_saves_and_rebuilds(app, user):
+    with app.app_context():
+        assert dashboard_data(user)['line']['labels'] == []
+        save_bill(user, '2025-01-10', 1000)
+        assert dashboard_data(user)['line']['labels'] == ['2025-01']
+
+        save_bill(user, '2025-02-10', 1000)
+        charts = dashboard_data(user)
+        assert charts['line']['labels'] == ['2025-01', '2025-02']
+        assert dashboard_data(user) == charts
+
+        # A data fix applied outside record_bill only reaches the rollups through a rebuild
+        db.session.execute(db.update(BillRecord).values(total_emission_kgco2e=1.0))
+        db.session.commit()
+        rebuild_rollups()
+        assert dashboard_data(user)['line']['data'] == [1.0, 1.0]
@@ -0,0 +1,37 @@
+# tests/test_factors.py
+import pytest
+from factors import factor_registry, SOURCE_FIELDS, DEFAULT_UNITS
+from forms import unit_choices
+
+FORM_UNITS = [(source, unit) for source, (_, unit_key) in SOURCE_FIELDS.items()
+              for unit in (unit_choices(unit_key) if unit_key else [DEFAULT_UNITS[source]])]
+
+
+@pytest.mark.parametrize('source, unit', FORM_UNITS)
+def test_every_form_unit_has_a_factor(source, unit):
+    assert factor_registry.resolve(source, unit) is not None
+    co2_tonnes, kgco2e = factor_registry.emissions(source, 250.0, unit)
+    assert co2_tonnes > 0 and kgco2e > 0
+
+
+@pytest.mark.parametrize('source, unit, amount, base_unit, base_amount', [
+    ('Water', 'm3', 2.0, 'liters', 2000.0),
+    ('Coal', 'tons', 3.0, 'kg', 3000.0),
+    ('Industrial Waste', 'tons', 0.5, 'kg', 500.0),
+    ('Methane', 'kg', 0.717, 'm3', 1.0),
+    ('Natural Gas', 'kg', 0.8, 'm3', 1.0),
+    ('Oil', 'kg', 0.88, 'liters', 1.0),
+    ('Petrol', 'kg', 0.74, 'liters', 1.0),
+    ('Diesel', 'kg', 0.835, 'liters', 1.0),
+])
+def test_unit_conversions(source, unit, amount, base_unit, base_amount):
+    assert factor_registry.emissions(source, amount, unit) == pytest.approx(
+        factor_registry.emissions(source, base_amount, base_unit))
+
+
+def test_trade_co2_tons_use_the_csv_tonnes_curve():
+    curves = factor_registry.curves()
+    assert ('Trade CO₂ Value', 'tonnes') in curves
+    curve, multiplier = factor_registry.resolve('Trade CO₂ Value', 'tons')
+    assert curve is curves[('Trade CO₂ Value', 'tonnes')]
+    assert multiplier == 1.0
@@ -0,0 +1,133 @@
+# tests/test_jobs.py
+import io
+import threading
+import time
+from datetime import datetime, timedelta
+from models import db, BillJob
+from jobs import STALE_JOB_ERROR
+from conftest import PASSWORD, StubOcr
+
+
+def upload(client, content=b'fake bill image', filename='bill.png'):
+    response = client.post('/upload', data={'bill_file': (io.BytesIO(content), filename)},
+                           content_type='multipart/form-data')
+    assert response.status_code == 302
+    return int(response.headers['Location'].rstrip('/').rsplit('/', 1)[-1])
+
+
+def wait_for_job(client, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(f'/jobs/{job_id}/status').get_json()
+        if status['status'] in ('done', 'failed'):
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f'job {job_id} still {status["status"]} after {timeout}s')
+
+
+def add_stale_job(app, user, tmp_path, status):
+    bill = tmp_path / 'stale.png'
+    bill.write_bytes(b'bill left behind by a restart')
+    long_ago = datetime.utcnow() - timedelta(hours=1)
+    with app.app_context():
+        job = BillJob(user_id=user, bill_file_path=str(bill), status=status, created_at=long_ago,
+                      started_at=long_ago if status == 'running' else None)
+        db.session.add(job)
+        db.session.commit()
+        return job.id
+
+
+def test_upload_job_prefills_edit_form(client, stubs):
+    job_id = upload(client)
+    status = wait_for_job(client, job_id)
+    assert status['status'] == 'done', status
+    assert status['edit_url'].endswith(f'edit_bill?job_id={job_id}')
+    assert len(stubs.ocr.calls) == 1
+    assert stubs.llm.calls == ['Electricity consumed 1000 kWh']
+
+    page = client.get(status['edit_url']).get_data(as_text=True)
+    assert 'value="INV-42"' in page
+    assert 'value="2025-03-14"' in page
+    assert 'value="1000.0"' in page
+
+
+def test_ocr_failure_marks_job_failed(client, stubs):
+    stubs.ocr.error = 'OCR.Space error: unreadable image'
+    job_id = upload(client)
+    status = wait_for_job(client, job_id)
+    assert status['status'] == 'failed'
+    assert status['error'] == 'OCR.Space error: unreadable image'
+    assert 'edit_url' not in status
+    assert stubs.llm.calls == []
+
+    # A failed job has nothing to prefill
+    page = client.get(f'/edit_bill?job_id={job_id}').get_data(as_text=True)
+    assert 'INV-42' not in page
+
+
+def test_extractor_failure_marks_job_failed(client, stubs):
+    stubs.llm.fields = {'error': 'Gemini unavailable: gemini is failing'}
+    status = wait_for_job(client, upload(client))
+    assert status['status'] == 'failed'
+    assert status['error'] == 'Gemini unavailable: gemini is failing'
+
+
+def test_other_companies_cannot_see_a_job(app, client, stubs):
+    job_id = upload(client)
+    wait_for_job(client, job_id)
+    with app.app_context():
+        db.session.execute(db.update(BillJob).values(user_id=999))
+        db.session.commit()
+    assert client.get(f'/jobs/{job_id}/status').status_code == 404
+
+
+def test_jobs_interrupted_by_a_restart_are_resubmitted(app, user, stubs, tmp_path):
+    job_id = add_stale_job(app, user, tmp_path, 'running')
+    # The first request served by the new process picks the job up again
+    client = app.test_client()
+    client.post('/login', data={'email': 'acme@example.com', 'password': PASSWORD})
+    status = wait_for_job(client, job_id)
+    assert status['status'] == 'done', status
+    assert len(stubs.ocr.calls) == 1
+
+
+def test_stale_jobs_stop_polling(app, user, client, stubs, tmp_path):
+    job_id = add_stale_job(app, user, tmp_path, 'queued')
+    status = client.get(f'/jobs/{job_id}/status').get_json()
+    assert status['status'] == 'failed'
+    assert status['error'] == STALE_JOB_ERROR
+    assert stubs.ocr.calls == []
+
+
+def test_extraction_cache_is_per_backend(app, stubs, tmp_path):
+    bill = tmp_path / 'bill.png'
+    bill.write_bytes(b'same bill, two backends')
+    pipeline = app.extensions['bill_pipeline']
+    assert pipeline(str(bill))['bill_number'] == stubs.llm.fields['bill_number']
+    pipeline(str(bill))
+    assert len(stubs.ocr.calls) == len(stubs.llm.calls) == 1
+
+    stubs.llm.cache_name = 'other-model'
+    pipeline(str(bill))
+    assert len(stubs.ocr.calls) == 1
+    assert len(stubs.llm.calls) == 2
+
+
+class BarrierOcr(StubOcr):
+    """Holds each call until `parties` calls are in flight, so they all miss the cache together."""
+
+    def __init__(self, parties):
+        super().__init__()
+        self.barrier = threading.Barrier(parties, timeout=5)
+
+    def __call__(self, file_path, timeout=None):
+        self.barrier.wait()
+        return super().__call__(file_path, timeout)
+
+
+def test_concurrent_uploads_of_the_same_file(client, stubs):
+    stubs.ocr = BarrierOcr(4)
+    job_ids = [upload(client, b'the same bill') for _ in range(4)]
+    statuses = [wait_for_job(client, job_id) for job_id in job_ids]
+    assert [status['status'] for status in statuses] == ['done'] * 4, statuses
+    assert len(stubs.ocr.calls) == 4
@@ -0,0 +1,93 @@
+# tests/test_migrations.py
+import sqlite3
+import pytest
+from sqlalchemy import inspect
+from conftest import make_app, close_app
+from factors import factor_registry, SOURCE_FIELDS
+from migrations import upgrade
+from models import db, BillRecord, BillUsage, CompanyEmissionSummary, EmissionRollup
+from rollups import ALL_COMPANIES, TOTAL
+
+# bill_record as it was before usage rows moved into bill_usage: one value/unit column pair per source
+WIDE_COLUMNS = ''.join(f'{value_key} FLOAT, ' + (f'{unit_key} VARCHAR(20), ' if unit_key else '')
+                       for value_key, unit_key in SOURCE_FIELDS.values())
+LEGACY_SCHEMA = f'''
+CREATE TABLE user (id INTEGER PRIMARY KEY, company_name VARCHAR(100) NOT NULL, email VARCHAR(120) UNIQUE NOT NULL,
+                   password_hash VARCHAR(128) NOT NULL, logo_path VARCHAR(200));
+CREATE TABLE bill_record (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES user (id), bill_date DATE,
+                          bill_number VARCHAR(50), {WIDE_COLUMNS}billing_period_start DATE, billing_period_end DATE,
+                          total_co2_tonnes FLOAT, total_emission_kgco2e FLOAT, uploaded_at DATETIME,
+                          bill_file_path VARCHAR(200));
+'''
+# (id, user_id, bill_date, stored total kgCO2e, {column: value}); the stored totals are stale on purpose
+LEGACY_BILLS = [
+    (1, 1, '2024-01-15', 0.0, {'electricity_usage_value': 1000.0, 'electricity_usage_unit': 'kWh',
+                               'water_usage_value': 5.0, 'water_usage_unit': 'm3', 'trade_co2_value': 2.0}),
+    (2, 1, '2024-02-03', 999.0, {'diesel_usage_value': 100.0, 'diesel_usage_unit': 'liters',
+                                 'oil_usage_value': 0.0, 'oil_usage_unit': 'liters',
+                                 'coal_usage_value': 1.0, 'coal_usage_unit': 'tons'}),
+    (3, 2, None, 12.5, {'water_usage_value': 500.0, 'water_usage_unit': 'liters',
+                        'natural_gas_usage_value': 10.0, 'natural_gas_usage_unit': 'm3'}),
+]
+EXPECTED_USAGES = {
+    (1, 'Electricity', 'kWh', 1000.0), (1, 'Water', 'm3', 5.0), (1, 'Trade CO₂ Value', 'tons', 2.0),
+    (2, 'Diesel', 'liters', 100.0), (2, 'Coal', 'tons', 1.0),
+    (3, 'Water', 'liters', 500.0), (3, 'Natural Gas', 'm3', 10.0),
+}
+
+
+@pytest.fixture
+def legacy_app(tmp_path):
+    connection = sqlite3.connect(tmp_path / 'test.db')
+    connection.executescript(LEGACY_SCHEMA)
+    connection.executemany('INSERT INTO user (id, company_name, email, password_hash) VALUES (?, ?, ?, ?)',
+                           [(1, 'Acme', 'acme@example.com', 'x'), (2, 'Beta', 'beta@example.com', 'x')])
+    for bill_id, user_id, bill_date, total, usage in LEGACY_BILLS:
+        columns = ['id', 'user_id', 'bill_date', 'total_emission_kgco2e', *usage]
+        connection.execute(f"INSERT INTO bill_record ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                           [bill_id, user_id, bill_date, total, *usage.values()])
+    connection.commit()
+    connection.close()
+    app = make_app(tmp_path)
+    yield app
+    close_app(app)
+
+
+def test_upgrade_moves_wide_usage_columns_into_bill_usage(legacy_app):
+    with legacy_app.app_context():
+        upgrade(log=lambda message: None)
+
+        columns = {column['name'] for column in inspect(db.engine).get_columns('bill_record')}
+        assert not columns & {key for pair in SOURCE_FIELDS.values() for key in pair if key}
+
+        usages = BillUsage.query.all()
+        assert {(u.bill_id, u.source, u.unit, u.value) for u in usages} == EXPECTED_USAGES
+        for usage in usages:
+            co2_tonnes, kgco2e = factor_registry.emissions(usage.source, usage.value, usage.unit)
+            assert usage.kgco2e == pytest.approx(kgco2e) and kgco2e > 0
+            assert usage.co2_tonnes == pytest.approx(co2_tonnes)
+
+        # Totals are re-priced from the usage rows, replacing the stale stored values
+        bill_totals = {}
+        for usage in usages:
+            bill_totals[usage.bill_id] = bill_totals.get(usage.bill_id, 0.0) + usage.kgco2e
+        for bill in BillRecord.query.all():
+            assert bill.total_emission_kgco2e == pytest.approx(bill_totals[bill.id])
+            assert bill.total_co2_tonnes == pytest.approx(sum(u.co2_tonnes for u in bill.usages))
+
+        company_totals = {1: bill_totals[1] + bill_totals[2], 2: bill_totals[3]}
+        summaries = {s.user_id: (s.total_emission, s.bill_count) for s in CompanyEmissionSummary.query.all()}
+        assert summaries == {1: (pytest.approx(company_totals[1]), 2), 2: (pytest.approx(company_totals[2]), 1)}
+
+        rollups = {(r.user_id, r.granularity, r.period, r.source): (r.kgco2e, r.bill_count)
+                   for r in EmissionRollup.query.all()}
+        assert rollups[(1, 'month', '2024-01', TOTAL)] == (pytest.approx(bill_totals[1]), 1)
+        assert rollups[(1, 'month', '2024-02', TOTAL)] == (pytest.approx(bill_totals[2]), 1)
+        assert rollups[(1, 'year', '2024', TOTAL)] == (pytest.approx(company_totals[1]), 2)
+        assert rollups[(2, 'all', '', TOTAL)] == (pytest.approx(company_totals[2]), 1)
+        assert rollups[(ALL_COMPANIES, 'all', '', TOTAL)] == (pytest.approx(sum(company_totals.values())), 3)
+        assert rollups[(ALL_COMPANIES, 'all', '', 'Water')][1] == 2
+        # The undated bill only counts towards the all-time rows
+        assert not any(user_id == 2 and granularity != 'all' for user_id, granularity, _, _ in rollups)
+
+        assert upgrade(log=lambda message: None) == []
@@ -0,0 +1,25 @@
+# tests/test_preprocess.py
+import os
+from PIL import Image
+from preprocess import preprocess_for_ocr
+
+
+def test_exif_orientation_is_applied(tmp_path):
+    path = tmp_path / 'sideways.jpg'
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90° clockwise to display
+    Image.new('L', (3000, 2000), 0).save(path, 'JPEG', quality=95, exif=exif, dpi=(600, 600))
+    out_path, stats = preprocess_for_ocr(str(path))
+    assert out_path != str(path)
+    with Image.open(out_path) as processed:
+        assert processed.height > processed.width
+    assert stats['processed_bytes'] < stats['original_bytes']
+    os.remove(out_path)
+
+
+def test_unreadable_image_is_passed_through(tmp_path):
+    path = tmp_path / 'broken.png'
+    path.write_bytes(b'not an image at all')
+    out_path, stats = preprocess_for_ocr(str(path))
+    assert out_path == str(path)
+    assert stats == {'original_bytes': 19, 'processed_bytes': 19}
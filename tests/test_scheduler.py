@@ -0,0 +1,151 @@
+# tests/test_scheduler.py
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+from scheduler import RemoteScheduler, CircuitBreaker, CircuitOpen, QueueTimeout, schedulers
+from extractors import ocr_space_extract, gemini_extract_details, make_ocr_backend, make_field_extractor
+
+OCR_TEXT = 'Electricity 100 kWh'
+GEMINI_TEXT = '```json\n{"bill_number": "F1", "electricity_usage_value": 100, "electricity_usage_unit": "kWh"}\n```'
+
+
+class FakeRemote(BaseHTTPRequestHandler):
+    """OCR.Space /parse and Gemini REST generateContent, failing the first `fail` calls of each."""
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode())
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        state = self.server.state
+        provider = 'ocr' if self.path.startswith('/parse') else 'gemini'
+        state[f'{provider}_calls'] += 1
+        if state[f'{provider}_fail'] > 0:
+            state[f'{provider}_fail'] -= 1
+            if provider == 'ocr':
+                return self.reply(503, {'error': 'busy'})
+            return self.reply(429, {'error': {'code': 429, 'message': 'quota', 'status': 'RESOURCE_EXHAUSTED'}})
+        if provider == 'ocr':
+            return self.reply(200, {'IsErroredOnProcessing': False, 'ParsedResults': [{'ParsedText': OCR_TEXT}]})
+        self.reply(200, {'candidates': [{'content': {'parts': [{'text': GEMINI_TEXT}], 'role': 'model'},
+                                         'finishReason': 'STOP', 'index': 0}]})
+
+
+@pytest.fixture
+def remote():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeRemote)
+    server.state = {'ocr_calls': 0, 'ocr_fail': 0, 'gemini_calls': 0, 'gemini_fail': 0}
+    server.url = f'http://127.0.0.1:{server.server_port}'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def make_scheduler():
+    names = []
+
+    def make(name, **kwargs):
+        kwargs.setdefault('backoff', 0.01)
+        names.append(name)
+        return RemoteScheduler(name, **kwargs)
+    yield make
+    for name in names:
+        schedulers.pop(name, None)
+
+
+@pytest.fixture
+def bill(tmp_path):
+    path = tmp_path / 'bill.jpg'
+    path.write_bytes(b'fake bill image')
+    return str(path)
+
+
+def test_ocr_retries_server_errors_until_success(remote, make_scheduler, bill):
+    remote.state['ocr_fail'] = 2
+    scheduler = make_scheduler('test-ocr', rate_per_minute=0, retries=3)
+    result = ocr_space_extract(bill, api_key='key', url=remote.url + '/parse', scheduler=scheduler)
+    assert result == {'text': OCR_TEXT, 'error': ''}
+    assert remote.state['ocr_calls'] == 3
+    assert scheduler.outcomes == {'retry': 2, 'ok': 1}
+
+
+def test_gemini_retries_rate_limit_until_success(remote, make_scheduler):
+    remote.state['gemini_fail'] = 1
+    scheduler = make_scheduler('test-gemini', rate_per_minute=0)
+    result = gemini_extract_details(OCR_TEXT, gemini_api_key='key', endpoint=remote.url, scheduler=scheduler)
+    assert result['bill_number'] == 'F1'
+    assert result['electricity_usage_value'] == 100
+    assert remote.state['gemini_calls'] == 2
+
+
+def test_breaker_opens_and_recovers(remote, make_scheduler, bill):
+    remote.state['ocr_fail'] = 100
+    scheduler = make_scheduler('test-breaker', rate_per_minute=0, retries=1, failure_threshold=3,
+                               reset_timeout=0.3)
+    errors = [ocr_space_extract(bill, url=remote.url + '/parse', scheduler=scheduler)['error'] for _ in range(4)]
+    # Two calls of two attempts each; the third failure opens the circuit and later calls never reach the server
+    assert remote.state['ocr_calls'] == 3
+    assert scheduler.breaker.state == CircuitBreaker.OPEN
+    assert errors[-1].startswith('OCR.Space unavailable: test-breaker is failing')
+
+    time.sleep(0.35)
+    remote.state['ocr_fail'] = 0
+    result = ocr_space_extract(bill, url=remote.url + '/parse', scheduler=scheduler)
+    assert result == {'text': OCR_TEXT, 'error': ''}
+    assert scheduler.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_deadline_raises_queue_timeout(make_scheduler):
+    scheduler = make_scheduler('test-deadline', rate_per_minute=1, burst=1, deadline=0.3)
+    assert scheduler.call(lambda: 'first') == 'first'
+    started = time.monotonic()
+    with pytest.raises(QueueTimeout):
+        scheduler.call(lambda: 'second')
+    assert time.monotonic() - started < 0.3
+    assert scheduler.outcomes['queue_timeout'] == 1
+
+
+def test_rejected_trial_does_not_take_a_token(make_scheduler):
+    scheduler = make_scheduler('test-trial', rate_per_minute=1, burst=1, failure_threshold=1, reset_timeout=0)
+    scheduler.breaker.record_failure()
+    assert scheduler.breaker.allow()  # another caller holds the half-open trial
+    with pytest.raises(CircuitOpen):
+        scheduler.call(lambda: 'too early')
+    assert scheduler.bucket.tokens == 1
+
+
+def test_trial_is_released_when_no_token_is_left(make_scheduler):
+    scheduler = make_scheduler('test-release', rate_per_minute=1, burst=1, deadline=0.1, failure_threshold=1,
+                               reset_timeout=0)
+    assert scheduler.bucket.acquire()
+    scheduler.breaker.record_failure()
+    with pytest.raises(QueueTimeout):
+        scheduler.call(lambda: 'no token')
+    assert scheduler.breaker.allow()
+
+
+def test_backends_use_configured_endpoints(remote, bill):
+    ocr = make_ocr_backend({'OCR_BACKEND': 'ocrspace', 'OCR_SPACE_API_KEY': 'key',
+                            'OCR_SPACE_URL': remote.url + '/parse'})
+    extractor = make_field_extractor({'FIELD_EXTRACTOR': 'gemini', 'GEMINI_API_KEY': 'key',
+                                      'GEMINI_API_ENDPOINT': remote.url})
+    text = ocr(bill)['text']
+    assert extractor(text)['bill_number'] == 'F1'
+    assert remote.state == {'ocr_calls': 1, 'ocr_fail': 0, 'gemini_calls': 1, 'gemini_fail': 0}
+
+
+def test_ocr_space_uses_configured_language():
+    ocr = make_ocr_backend({'OCR_BACKEND': 'ocrspace', 'OCR_LANGUAGE': 'tha'})
+    assert ocr.language == 'tha'
+    assert ocr.cache_name == 'ocrspace:tha'
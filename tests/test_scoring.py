@@ -0,0 +1,35 @@
+# tests/test_scoring.py
+import random
+from models import db, User, CompanyEmissionSummary
+from scoring import leaderboard_entries, company_score
+
+
+def seed_companies(n, rng):
+    """n companies; about a fifth without bills, totals drawn from a small set so ranks tie."""
+    totals = [0.0, 12.5, 100.0, 100.0, 233.0, 1000.0, 1000.0, 5400.25]
+    for i in range(n):
+        user = User(company_name=f'Company {i}', email=f'company{i}@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        if rng.random() < 0.8:
+            db.session.add(CompanyEmissionSummary(user_id=user.id, total_emission=rng.choice(totals),
+                                                  bill_count=rng.randrange(0, 9)))
+    db.session.commit()
+
+
+def test_leaderboard_matches_compute_score(app):
+    with app.app_context():
+        seed_companies(60, random.Random(7))
+        totals = {s.user_id: s.total_emission for s in CompanyEmissionSummary.query.all()}
+        expected = sorted(((company_score(user_id), totals.get(user_id, 0), user_id)
+                           for (user_id,) in db.session.query(User.id)),
+                          key=lambda row: (-row[0], row[1], row[2]))
+
+        entries = leaderboard_entries()
+        assert [(e['score'], e['total_emission'], e['user_id']) for e in entries] == expected
+        assert [e['rank'] for e in entries] == list(range(1, 61))
+        assert len({e['score'] for e in entries}) < len(entries)  # the data has ties
+        assert any(e['score'] == 0 for e in entries)
+
+        pages = [leaderboard_entries(offset, 25) for offset in (0, 25, 50)]
+        assert [e for page in pages for e in page] == entries
@@ -0,0 +1,100 @@
+# thumbnails.py
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+THUMB_DIR = 'thumbs'
+BILL_THUMB_SIZE = (400, 400)  # previous_bills cards are 200px high; 2x for high-DPI screens
+LOGO_THUMB_SIZE = (64, 64)    # leaderboard logos are shown at 30x30
+
+
+def render_thumbnail(source_path, thumb_path, size):
+    from PIL import Image, ImageOps
+    if source_path.lower().endswith('.pdf'):
+        from pdf2image import convert_from_path
+        image = convert_from_path(source_path, dpi=50, first_page=1, last_page=1)[0]
+    else:
+        image = Image.open(source_path)
+        # JPEG draft mode decodes at a reduced scale, far cheaper than a full decode
+        image.draft('RGB', size)
+        image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    image = image.convert('RGB')
+    image.thumbnail(size)
+    os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+    tmp_path = thumb_path + '.part'
+    image.save(tmp_path, 'JPEG', quality=80, optimize=True)
+    os.replace(tmp_path, thumb_path)
+
+
+class Thumbnailer:
+    """Writes JPEG thumbnails of uploads on a background pool.
+
+    Pages ask for thumbnail_relpath(); until the thumbnail exists they get the original upload and a
+    render is queued, so files uploaded before thumbnails existed are covered too.
+    """
+
+    def __init__(self, app=None):
+        self.upload_folder = 'uploads'
+        self.executor = None
+        self.logger = None
+        self._pending = set()
+        self._failed = set()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.upload_folder = app.config['UPLOAD_FOLDER']
+        self.logger = app.logger
+        if self.executor is not None:
+            # Re-initialised for another app: let the old pool finish its work and exit
+            self.executor.shutdown(wait=False)
+        self.executor = ThreadPoolExecutor(max_workers=app.config.get('THUMBNAIL_WORKERS', 2),
+                                           thread_name_prefix='thumbnail')
+        app.extensions['thumbnailer'] = self
+
+    @staticmethod
+    def thumb_relpath(relpath, size):
+        stem = os.path.splitext(relpath)[0]
+        return f'{THUMB_DIR}/{stem}.{size[0]}x{size[1]}.jpg'
+
+    def schedule(self, relpath, size):
+        key = (relpath, size)
+        with self._lock:
+            if key in self._pending or key in self._failed:
+                return
+            self._pending.add(key)
+        self.executor.submit(self._render, relpath, size)
+
+    def _render(self, relpath, size):
+        key = (relpath, size)
+        try:
+            source = os.path.join(self.upload_folder, relpath)
+            thumb = os.path.join(self.upload_folder, self.thumb_relpath(relpath, size))
+            if not os.path.exists(thumb):
+                render_thumbnail(source, thumb, size)
+        except Exception as e:
+            with self._lock:
+                self._failed.add(key)
+            if self.logger:
+                self.logger.warning('Thumbnail for %s failed: %s', relpath, e)
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def thumbnail_relpath(self, relpath, size):
+        """Relative path of the thumbnail if it is ready, else of the original (queueing a render)."""
+        thumb = self.thumb_relpath(relpath, size)
+        if os.path.exists(os.path.join(self.upload_folder, thumb)):
+            return thumb
+        if os.path.exists(os.path.join(self.upload_folder, relpath)):
+            self.schedule(relpath, size)
+        return relpath
+
+
+thumbnailer = Thumbnailer()
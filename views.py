@@ -0,0 +1,353 @@
+# views.py
+import os
+from datetime import datetime
+from functools import partial
+import click
+from flask import Blueprint, current_app, render_template, redirect, url_for, flash, request, jsonify, send_from_directory, Response, stream_with_context, abort
+from flask_login import login_user, logout_user, login_required, current_user
+from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
+from sqlalchemy.orm import selectinload
+from models import db, User, BillRecord, BillJob
+from forms import RegistrationForm, LoginForm, BillUploadForm, BulkBillUploadForm, BillEditForm
+from factors import SOURCE_FIELDS
+from emissions import apply_usage
+from scoring import record_bill, rebuild_summaries, leaderboard_entries
+from jobs import job_queue, job_result
+from bulk import save_bulk_files, extract_all, bill_data, build_bill
+from storage import save_content_addressed, upload_relpath, is_content_addressed, FileTooLarge
+from thumbnails import thumbnailer, BILL_THUMB_SIZE, LOGO_THUMB_SIZE
+from chart_cache import chart_cache
+from charts import dashboard_data
+from rollups import rebuild_rollups, year_over_year, sector_monthly_averages
+from export import EXPORT_FORMATS, export_batches, stream_export
+from metrics import span
+from migrations import upgrade, pending_migrations
+
+# cli_group=None keeps the commands at the top level (flask migrate-db, not flask main migrate-db)
+main = Blueprint('main', __name__, cli_group=None)
+
+# Template kinds: (directory under UPLOAD_FOLDER, thumbnail size)
+UPLOAD_KINDS = {'bill': ('bills', BILL_THUMB_SIZE), 'logo': ('logos', LOGO_THUMB_SIZE)}
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+@main.app_template_filter('upload_url')
+def upload_url_filter(path, kind='bill'):
+    subdir, _ = UPLOAD_KINDS[kind]
+    return url_for('main.uploaded_file', filename=upload_relpath(path, current_app.config['UPLOAD_FOLDER'], subdir))
+
+@main.app_template_filter('thumbnail_url')
+def thumbnail_url_filter(path, kind='bill'):
+    subdir, size = UPLOAD_KINDS[kind]
+    relpath = upload_relpath(path, current_app.config['UPLOAD_FOLDER'], subdir)
+    return url_for('main.uploaded_file', filename=thumbnailer.thumbnail_relpath(relpath, size))
+
+def queue_thumbnail(path, kind):
+    subdir, size = UPLOAD_KINDS[kind]
+    thumbnailer.schedule(upload_relpath(path, current_app.config['UPLOAD_FOLDER'], subdir), size)
+
+@main.app_errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    message = f"Upload is larger than the {current_app.config['MAX_CONTENT_LENGTH'] / (1024 * 1024):g} MB limit."
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'error': message}), 413
+    flash(message)
+    return redirect(request.url)
+
+@main.route('/uploads/<path:filename>')
+def uploaded_file(filename):
+    # Content-addressed files never change, so clients may cache them indefinitely
+    immutable = is_content_addressed(filename)
+    max_age = IMMUTABLE_MAX_AGE if immutable else current_app.config['UPLOAD_CACHE_MAX_AGE']
+    response = send_from_directory(current_app.config['UPLOAD_FOLDER'], filename, max_age=max_age)
+    response.cache_control.immutable = immutable
+    if not filename.startswith('logos/') and not filename.startswith('thumbs/logos/'):
+        # Bills are company data; keep them out of shared caches
+        response.cache_control.public = False
+        response.cache_control.private = True
+    return response
+
+@main.route('/', methods=['GET', 'POST'])
+def register():
+    form = RegistrationForm()
+    if form.validate_on_submit():
+        if User.query.filter_by(email=form.email.data).first():
+            flash('Email already registered.')
+            return redirect(url_for('main.register'))
+        user = User(company_name=form.company_name.data, email=form.email.data)
+        user.set_password(form.password.data)
+        if form.logo.data:
+            filename = secure_filename(form.logo.data.filename)
+            try:
+                logo_path, _ = save_content_addressed(form.logo.data.stream,
+                                                      os.path.join(current_app.config['UPLOAD_FOLDER'], 'logos'),
+                                                      filename, max_bytes=current_app.config['UPLOAD_MAX_FILE_BYTES'])
+            except FileTooLarge as e:
+                flash(str(e))
+                return render_template('register.html', form=form)
+            user.logo_path = logo_path
+            queue_thumbnail(logo_path, 'logo')
+        db.session.add(user)
+        db.session.commit()
+        flash('Registration successful. Please log in.')
+        return redirect(url_for('main.login'))
+    return render_template('register.html', form=form)
+
+@main.route('/login', methods=['GET', 'POST'])
+def login():
+    form = LoginForm()
+    if form.validate_on_submit():
+        user = User.query.filter_by(email=form.email.data).first()
+        if user and user.check_password(form.password.data):
+            login_user(user)
+            return redirect(url_for('main.dashboard'))
+        flash('Invalid email or password.')
+    return render_template('login.html', form=form)
+
+@main.route('/logout')
+@login_required
+def logout():
+    logout_user()
+    return redirect(url_for('main.login'))
+
+@main.route('/upload', methods=['GET', 'POST'])
+@login_required
+def upload():
+    form = BillUploadForm()
+    if form.validate_on_submit():
+        filename = secure_filename(form.bill_file.data.filename)
+        # Identical files are stored once under their content hash
+        try:
+            with span('save_file'):
+                file_path, _ = save_content_addressed(form.bill_file.data.stream,
+                                                      os.path.join(current_app.config['UPLOAD_FOLDER'], 'bills'),
+                                                      filename, max_bytes=current_app.config['UPLOAD_MAX_FILE_BYTES'])
+        except FileTooLarge as e:
+            flash(str(e))
+            return render_template('upload.html', form=form)
+        queue_thumbnail(file_path, 'bill')
+        # Process with OCR and Gemini in the background
+        job = job_queue.enqueue(current_user.id, file_path)
+        return redirect(url_for('main.job_detail', job_id=job.id))
+    return render_template('upload.html', form=form)
+
+@main.route('/upload/bulk', methods=['GET', 'POST'])
+@login_required
+def bulk_upload():
+    form = BulkBillUploadForm()
+    report = []
+    if form.validate_on_submit():
+        saved, rejected = save_bulk_files(form.bill_files.data, os.path.join(current_app.config['UPLOAD_FOLDER'], 'bills'),
+                                          max_bytes=current_app.config['UPLOAD_MAX_FILE_BYTES'])
+        for _, path in saved:
+            queue_thumbnail(path, 'bill')
+        # Retries, backoff and provider rate limits are handled by the remote call schedulers
+        timeout = current_app.config['REMOTE_CALL_TIMEOUT']
+        bill_pipeline = current_app.extensions['bill_pipeline']
+        pipeline = bill_pipeline.with_backends(ocr=partial(bill_pipeline.ocr, timeout=timeout),
+                                               llm=partial(bill_pipeline.llm, timeout=timeout))
+        results = extract_all([path for _, path in saved], pipeline,
+                              max_workers=current_app.config['BULK_UPLOAD_WORKERS'],
+                              timeout=current_app.config['BULK_FILE_TIMEOUT'])
+        bills = []
+        for (filename, path), result in zip(saved, results):
+            entry = {'filename': filename, 'status': 'failed', 'error': result.get('error'), 'emission_kgco2e': None}
+            if not entry['error']:
+                try:
+                    bill = build_bill(current_user.id, bill_data(result), path)
+                except ValueError as e:
+                    entry['error'] = str(e)
+                else:
+                    bills.append(bill)
+                    entry.update(status='saved', emission_kgco2e=bill.total_emission_kgco2e)
+            report.append(entry)
+        report.extend({'filename': filename, 'status': 'failed', 'error': error, 'emission_kgco2e': None}
+                      for filename, error in rejected)
+        if bills:
+            # All bills of the batch go in with a single commit
+            db.session.add_all(bills)
+            for bill in bills:
+                record_bill(bill)
+            db.session.commit()
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'saved': len(bills), 'failed': len(report) - len(bills), 'files': report})
+        flash(f'Saved {len(bills)} of {len(report)} bills.')
+    return render_template('bulk_upload.html', form=form, report=report)
+
+@main.route('/jobs/<int:job_id>')
+@login_required
+def job_detail(job_id):
+    job = job_queue.expire_if_stale(BillJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404())
+    return render_template('job_status.html', job=job)
+
+@main.route('/jobs/<int:job_id>/status')
+@login_required
+def job_status(job_id):
+    job = job_queue.expire_if_stale(BillJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404())
+    payload = {'id': job.id, 'status': job.status, 'error': job.error,
+               'original_bytes': job.original_bytes, 'processed_bytes': job.processed_bytes, 'ocr_ms': job.ocr_ms}
+    if job.status == 'done':
+        payload['edit_url'] = url_for('main.edit_bill', job_id=job.id)
+    return jsonify(payload)
+
+@main.route('/edit_bill', methods=['GET', 'POST'])
+@login_required
+def edit_bill():
+    form = BillEditForm()
+    if request.method == 'POST':
+        if form.validate_on_submit():
+            bill = BillRecord(user_id=current_user.id)
+            bill.bill_date = form.bill_date.data
+            bill.bill_number = form.bill_number.data
+            bill.billing_period_start = form.billing_period_start.data
+            bill.billing_period_end = form.billing_period_end.data
+            bill.bill_file_path = form.bill_file_path.data
+            apply_usage(bill, form.data)
+            db.session.add(bill)
+            record_bill(bill)
+            with span('db_commit'):
+                db.session.commit()
+            flash('Bill saved successfully.')
+            return redirect(url_for('main.dashboard'))
+    else:
+        job_id = request.args.get('job_id', type=int)
+        job = BillJob.query.filter_by(id=job_id, user_id=current_user.id, status='done').first() if job_id else None
+        if job:
+            extracted = job_result(job)
+            form.bill_file_path.data = job.bill_file_path
+            if extracted.get('bill_date'):
+                try:
+                    form.bill_date.data = datetime.strptime(extracted['bill_date'], '%Y-%m-%d').date()
+                except:
+                    pass
+            form.bill_number.data = extracted.get('bill_number', '')
+            for value_key, unit_key in SOURCE_FIELDS.values():
+                if extracted.get(value_key) is not None:
+                    form[value_key].data = float(extracted[value_key])
+                if unit_key:
+                    form[unit_key].data = extracted.get(unit_key, '')
+            if extracted.get('billing_period_start'):
+                try:
+                    form.billing_period_start.data = datetime.strptime(extracted['billing_period_start'], '%Y-%m-%d').date()
+                except:
+                    pass
+            if extracted.get('billing_period_end'):
+                try:
+                    form.billing_period_end.data = datetime.strptime(extracted['billing_period_end'], '%Y-%m-%d').date()
+                except:
+                    pass
+    return render_template('edit_bill.html', form=form)
+
+@main.route('/dashboard')
+@login_required
+def dashboard():
+    chart_data = dashboard_data(current_user.id)
+    return render_template('dashboard.html', chart_data=chart_data)
+
+@main.route('/dashboard/cache_stats')
+@login_required
+def chart_cache_stats():
+    return jsonify(chart_cache.stats())
+
+@main.route('/trends')
+@login_required
+def trends():
+    return render_template('trends.html', years=year_over_year(current_user.id),
+                           sector=sector_monthly_averages(current_user.id))
+
+@main.route('/leaderboard')
+@login_required
+def leaderboard():
+    leaderboard_data = leaderboard_entries()
+    return render_template('leaderboard.html', leaderboard=leaderboard_data)
+
+def parse_export_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+    except ValueError:
+        raise ValueError(f'{name} must be YYYY-MM-DD')
+
+def export_format_available(fmt):
+    if fmt == 'parquet':
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            return False
+    return fmt in EXPORT_FORMATS
+
+@main.route('/export')
+@login_required
+def export_bills():
+    fmt = request.args.get('format', 'csv')
+    if not export_format_available(fmt):
+        abort(400, f"Unsupported export format '{fmt}'")
+    try:
+        start = parse_export_date(request.args.get('start'), 'start')
+        end = parse_export_date(request.args.get('end'), 'end')
+    except ValueError as e:
+        abort(400, str(e))
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    batches = export_batches(user_id=current_user.id, start=start, end=end)
+    return Response(stream_with_context(stream_export(fmt, batches)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=bills.{extension}'})
+
+@main.cli.command('export-bills')
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='csv', show_default=True)
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), required=True)
+@click.option('--user-id', type=int, help='Only export bills of this company.')
+@click.option('--start', help='Earliest bill date (YYYY-MM-DD).')
+@click.option('--end', help='Latest bill date (YYYY-MM-DD).')
+@click.option('--chunk-size', default=1000, show_default=True)
+def export_bills_command(fmt, output, user_id, start, end, chunk_size):
+    try:
+        start_date = parse_export_date(start, '--start')
+        end_date = parse_export_date(end, '--end')
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    if not export_format_available(fmt):
+        raise click.UsageError('Parquet export requires pyarrow.')
+    batches = export_batches(user_id=user_id, start=start_date, end=end_date, chunk_size=chunk_size)
+    with open(output, 'wb') as f:
+        for chunk in stream_export(fmt, batches):
+            f.write(chunk)
+    print(f'Exported bills to {output}.')
+
+@main.cli.command('migrate-db')
+def migrate_db_command():
+    applied = upgrade()
+    print(f'Applied {len(applied)} migrations.' if applied else 'Database is up to date.')
+
+@main.cli.command('migration-status')
+def migration_status_command():
+    pending = pending_migrations()
+    for version, name in pending:
+        print(f'pending  {version:>4}  {name}')
+    print(f'{len(pending)} pending migrations.')
+
+@main.cli.command('rebuild-summaries')
+def rebuild_summaries_command():
+    count = rebuild_summaries()
+    print(f'Rebuilt emission summaries for {count} companies.')
+
+@main.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    count = rebuild_rollups()
+    print(f'Rebuilt {count} emission rollup rows.')
+
+@main.cli.command('recalculate-emissions')
+@click.option('--chunk-size', default=5000, show_default=True, help='Bills read and written per batch.')
+def recalculate_emissions_command(chunk_size):
+    # pandas is only needed here, so it is not imported at startup
+    from recalc import recalculate_emissions
+    count, elapsed = recalculate_emissions(chunk_size=chunk_size)
+    rebuild_summaries()
+    rebuild_rollups()
+    rate = count / elapsed if elapsed else 0
+    print(f'Recalculated {count} bills in {elapsed:.2f}s ({rate:.0f} rows/sec).')
+
+@main.route('/previous_bills')
+@login_required
+def previous_bills():
+    bills = BillRecord.query.filter_by(user_id=current_user.id).options(selectinload(BillRecord.usages)) \
+        .order_by(BillRecord.uploaded_at.desc()).all()
+    return render_template('previous_bills.html', bills=bills)